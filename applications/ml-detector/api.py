@@ -1,154 +1,301 @@
 from __future__ import annotations
 
+import copy
 import logging
-from flask import Blueprint, jsonify, request, Response
+import threading
+from typing import List, Optional
+
+from flask import Blueprint, current_app, request, Response
+
+import msgspec
+import numpy as np
+import orjson
 
 from threat_detector import ThreatDetector
-from pydantic import ValidationError
 from metrics import (
-    generate_metrics_payload,
+    bucket_source,
+    cached_metrics_payload,
     REQUESTS_TOTAL,
     PROCESSING_TIME,
-    THREATS_DETECTED,
+    record_threats,
+)
+from schemas import (
+    DetectRequest,
+    UserBehaviorRequest,
+    ProcessMonitorRequest,
+    decode_request,
 )
-from schemas import DetectRequest, UserBehaviorRequest, ProcessMonitorRequest
 from prom_source import PrometheusSource
 
 logger = logging.getLogger(__name__)
 
+_inc_requests = REQUESTS_TOTAL.inc
+
+_UNSUPPORTED_MEDIA_TYPE = {"error": "Unsupported Media Type, expected application/json"}
+
+# Per-thread scratch row for /detect features; gthread workers reuse it
+# across requests instead of building a fresh array each time.
+_tls = threading.local()
+
+
+def _feature_buffer() -> np.ndarray:
+    """Return this thread's (1, FEATURE_DIM) float32 feature buffer."""
+    buf = getattr(_tls, "features", None)
+    if buf is None:
+        buf = _tls.features = np.empty((1, DetectRequest.FEATURE_DIM), dtype=np.float32)
+    return buf
+
+
+# (lower bound, label) pairs, checked in order; anything below falls to "low"
+_CONF_BUCKETS = ((0.7, "high"), (0.4, "medium"))
+
+
+def _confidence_level(confidence: float) -> str:
+    """Map a detection confidence to the THREATS_DETECTED confidence_level label."""
+    for bound, level in _CONF_BUCKETS:
+        if confidence > bound:
+            return level
+    return "low"
+
+
+def _reject_oversize() -> Optional[Response]:
+    """Return a 413 response when the declared body exceeds MAX_CONTENT_LENGTH.
+
+    Checked from the Content-Length header before the body is read, so
+    oversize posts never reach get_data() or the decoder.
+    """
+    limit = current_app.config.get("MAX_CONTENT_LENGTH")
+    cl = request.content_length
+    if limit is not None and cl is not None and cl > limit:
+        return _json({"error": "payload too large"}, 413)
+    return None
+
+
+def _json(obj, status: int = 200) -> Response:
+    """Serialize ``obj`` with orjson (numpy scalars included) into a JSON response."""
+    return Response(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype="application/json",
+    )
+
 
 def create_api(detector: ThreatDetector) -> Blueprint:
     api = Blueprint("api", __name__)
+    # One client (and HTTP connection pool) for every /detect/prom call
+    prom_src = PrometheusSource()
+
+    # Serialized /health body, rebuilt only when detector.training_version moves
+    health_cache = {"version": -1, "body": b""}
 
     @api.route("/health")
     def health() -> Response:
-        return jsonify(
-            {
-                "status": "healthy",
-                "service": "ml-detector",
-                "version": "2.0.0",
-                "models_trained": {
-                    "spatial": detector.spatial_detector.is_trained(),
-                    "temporal": detector.temporal_detector.is_trained(),
-                    "statistical": detector.statistical_detector.is_trained()
-                },
-            }
-        )
+        version = detector.training_version
+        if health_cache["version"] != version:
+            health_cache["body"] = orjson.dumps(
+                {
+                    "status": "healthy",
+                    "service": "ml-detector",
+                    "version": "2.0.0",
+                    "models_trained": detector.models_trained(),
+                }
+            )
+            health_cache["version"] = version
+        return Response(health_cache["body"], mimetype="application/json")
 
     @api.route("/metrics")
     def metrics() -> Response:
-        payload = generate_metrics_payload()
+        payload = cached_metrics_payload()
         return Response(payload, mimetype="text/plain; version=0.0.4; charset=utf-8")
 
     @api.route("/detect", methods=["POST"])
     def detect_threat() -> Response:
         if not request.is_json:
-            return jsonify({"error": "Unsupported Media Type, expected application/json"}), 415
+            return _json(_UNSUPPORTED_MEDIA_TYPE, 415)
+        if (oversize := _reject_oversize()) is not None:
+            return oversize
         try:
+            _inc_requests()
+            # Parse/validate outside the timer: PROCESSING_TIME covers detection only
+            try:
+                req = decode_request(request.get_data(cache=False), DetectRequest)
+            except msgspec.DecodeError as ve:
+                return _json({"error": str(ve)}, 400)
             with PROCESSING_TIME.time():
-                REQUESTS_TOTAL.inc()
-                try:
-                    req = DetectRequest(**(request.get_json(force=True) or {}))
-                except ValidationError as ve:
-                    return jsonify({"error": ve.errors()}), 400
-                detection_result = detector.detect(req.to_features_dict())
+                features = req.to_features_vector(_feature_buffer())
+                detection_result = detector.detect(req.to_features_dict(), features)
                 result = detection_result.to_dict()
                 # increment counters per threat (with required labels)
-                for t in result.get("threat_types", []):
-                    confidence = result.get("confidence", 0.0)
-                    confidence_level = "high" if confidence > 0.7 else "medium" if confidence > 0.4 else "low"
-                    THREATS_DETECTED.labels(
-                        threat_type=t, 
-                        confidence_level=confidence_level,
-                        source_ip="api_request"
-                    ).inc()
-                return jsonify(result)
+                confidence_level = _confidence_level(result.get("confidence", 0.0))
+                record_threats(
+                    result.get("threat_types", []), confidence_level, "api_request"
+                )
+                return _json(result)
         except Exception as e:
             logger.error(f"Detection error: {e}")
-            return (
-                jsonify({"error": str(e), "threat_detected": False, "confidence": 0.0}),
-                500,
+            return _json(
+                {"error": str(e), "threat_detected": False, "confidence": 0.0}, 500
             )
 
+    @api.route("/detect/batch", methods=["POST"])
+    def detect_batch() -> Response:
+        """Run detection over a JSON array of /detect payloads in one call."""
+        if not request.is_json:
+            return _json(_UNSUPPORTED_MEDIA_TYPE, 415)
+        if (oversize := _reject_oversize()) is not None:
+            return oversize
+        try:
+            _inc_requests()
+            try:
+                reqs = decode_request(
+                    request.get_data(cache=False), List[DetectRequest]
+                )
+            except msgspec.DecodeError as ve:
+                return _json({"error": str(ve)}, 400)
+            with PROCESSING_TIME.time():
+                features = np.empty(
+                    (len(reqs), DetectRequest.FEATURE_DIM), dtype=np.float32
+                )
+                for i, req in enumerate(reqs):
+                    req.to_features_vector(features[i:i + 1])
+                detection_results = detector.detect_batch(
+                    [req.to_features_dict() for req in reqs], features
+                )
+                results = [
+                    detection_result.to_dict() for detection_result in detection_results
+                ]
+                for result in results:
+                    confidence_level = _confidence_level(result.get("confidence", 0.0))
+                    record_threats(
+                        result.get("threat_types", []), confidence_level, "api_request"
+                    )
+                return _json(results)
+        except Exception as e:
+            logger.error(f"Batch detection error: {e}")
+            return _json({"error": str(e)}, 500)
+
     @api.route("/train", methods=["POST"])
     def train() -> Response:
         try:
             detector.train_models()
-            return jsonify({"status": "training completed"})
+            return _json({"status": "training completed"})
         except Exception as e:
-            return jsonify({"error": str(e)}), 500
+            return _json({"error": str(e)}, 500)
     
     @api.route("/detect/user", methods=["POST"])
     def detect_user_behavior() -> Response:
         """Detect suspicious user behavior patterns."""
         if not request.is_json:
-            return jsonify({"error": "Unsupported Media Type, expected application/json"}), 415
+            return _json(_UNSUPPORTED_MEDIA_TYPE, 415)
+        if (oversize := _reject_oversize()) is not None:
+            return oversize
         try:
+            _inc_requests()
+            try:
+                req = decode_request(request.get_data(cache=False), UserBehaviorRequest)
+            except msgspec.DecodeError as ve:
+                return _json({"error": str(ve)}, 400)
             with PROCESSING_TIME.time():
-                REQUESTS_TOTAL.inc()
-                try:
-                    req = UserBehaviorRequest(**(request.get_json(force=True) or {}))
-                except ValidationError as ve:
-                    return jsonify({"error": ve.errors()}), 400
-                
                 detection_result = detector.detect(req.to_features_dict())
                 result = detection_result.to_dict()
                 
                 # Update threat metrics
-                for t in result.get("threat_types", []):
-                    confidence = result.get("confidence", 0.0)
-                    confidence_level = "high" if confidence > 0.7 else "medium" if confidence > 0.4 else "low"
-                    THREATS_DETECTED.labels(
-                        threat_type=t, 
-                        confidence_level=confidence_level,
-                        source_ip=req.user_id
-                    ).inc()
+                confidence_level = _confidence_level(result.get("confidence", 0.0))
+                threat_types = result.get("threat_types", [])
+                if threat_types:
+                    logger.info(f"User {req.user_id} flagged: {threat_types}")
+                    record_threats(
+                        threat_types, confidence_level,
+                        bucket_source(req.user_id, "user"),
+                    )
                 
-                return jsonify(result)
+                return _json(result)
         except Exception as e:
             logger.error(f"User behavior detection error: {e}")
-            return jsonify({"error": str(e), "threat_detected": False, "confidence": 0.0}), 500
+            return _json(
+                {"error": str(e), "threat_detected": False, "confidence": 0.0}, 500
+            )
+
+    @api.route("/detect/user/batch", methods=["POST"])
+    def detect_user_behavior_batch() -> Response:
+        """Run user behavior detection over a JSON array of /detect/user payloads."""
+        if not request.is_json:
+            return _json(_UNSUPPORTED_MEDIA_TYPE, 415)
+        if (oversize := _reject_oversize()) is not None:
+            return oversize
+        try:
+            _inc_requests()
+            try:
+                reqs = decode_request(
+                    request.get_data(cache=False), List[UserBehaviorRequest]
+                )
+            except msgspec.DecodeError as ve:
+                return _json({"error": str(ve)}, 400)
+            with PROCESSING_TIME.time():
+                detection_results = detector.detect_batch(
+                    [req.to_features_dict() for req in reqs]
+                )
+                results = [
+                    detection_result.to_dict() for detection_result in detection_results
+                ]
+                for req, result in zip(reqs, results, strict=True):
+                    threat_types = result.get("threat_types", [])
+                    if threat_types:
+                        logger.info(f"User {req.user_id} flagged: {threat_types}")
+                        record_threats(
+                            threat_types,
+                            _confidence_level(result.get("confidence", 0.0)),
+                            bucket_source(req.user_id, "user"),
+                        )
+                return _json(results)
+        except Exception as e:
+            logger.error(f"User behavior batch detection error: {e}")
+            return _json({"error": str(e)}, 500)
 
     @api.route("/detect/process", methods=["POST"])
     def detect_process_behavior() -> Response:
         """Detect suspicious process behavior and malware indicators."""
         if not request.is_json:
-            return jsonify({"error": "Unsupported Media Type, expected application/json"}), 415
+            return _json(_UNSUPPORTED_MEDIA_TYPE, 415)
+        if (oversize := _reject_oversize()) is not None:
+            return oversize
         try:
+            _inc_requests()
+            try:
+                req = decode_request(
+                    request.get_data(cache=False), ProcessMonitorRequest
+                )
+            except msgspec.DecodeError as ve:
+                return _json({"error": str(ve)}, 400)
             with PROCESSING_TIME.time():
-                REQUESTS_TOTAL.inc()
-                try:
-                    req = ProcessMonitorRequest(**(request.get_json(force=True) or {}))
-                except ValidationError as ve:
-                    return jsonify({"error": ve.errors()}), 400
-                
                 detection_result = detector.detect(req.to_features_dict())
                 result = detection_result.to_dict()
                 
                 # Update threat metrics
-                for t in result.get("threat_types", []):
-                    confidence = result.get("confidence", 0.0)
-                    confidence_level = "high" if confidence > 0.7 else "medium" if confidence > 0.4 else "low"
-                    THREATS_DETECTED.labels(
-                        threat_type=t, 
-                        confidence_level=confidence_level,
-                        source_ip=req.process_name
-                    ).inc()
+                confidence_level = _confidence_level(result.get("confidence", 0.0))
+                threat_types = result.get("threat_types", [])
+                if threat_types:
+                    logger.info(
+                        f"Process {req.process_name} ({req.process_id}) "
+                        f"flagged: {threat_types}"
+                    )
+                    record_threats(
+                        threat_types, confidence_level,
+                        bucket_source(req.process_name, "process"),
+                    )
                 
-                return jsonify(result)
+                return _json(result)
         except Exception as e:
             logger.error(f"Process behavior detection error: {e}")
-            return jsonify({"error": str(e), "threat_detected": False, "confidence": 0.0}), 500
+            return _json(
+                {"error": str(e), "threat_detected": False, "confidence": 0.0}, 500
+            )
     
     @api.route("/stats")
     def stats() -> Response:
-        return jsonify(
+        return _json(
             {
-                "models_trained": {
-                    "spatial": detector.spatial_detector.is_trained(),
-                    "temporal": detector.temporal_detector.is_trained(),
-                    "statistical": detector.statistical_detector.is_trained()
-                },
+                "models_trained": detector.models_trained(),
                 "training_samples": len(detector.all_data_window),
                 "high_confidence_samples": len(detector.high_confidence_window),
             }
@@ -165,9 +312,12 @@ def create_api(detector: ThreatDetector) -> Blueprint:
         """
         try:
             payload = request.get_json(silent=True) or {}
-            src = PrometheusSource()
-            # allow runtime override of window/metrics
-            if isinstance(payload, dict):
+            src = prom_src
+            # allow runtime override of window/metrics on a per-request copy
+            if isinstance(payload, dict) and (
+                "window" in payload or "metrics" in payload
+            ):
+                src = copy.copy(prom_src)
                 if "window" in payload and isinstance(payload["window"], str):
                     src.window = payload["window"]
                 metrics = payload.get("metrics") or {}
@@ -179,26 +329,22 @@ def create_api(detector: ThreatDetector) -> Blueprint:
                     src.m_unique_ports = metrics.get("unique_ports", src.m_unique_ports)
             features = src.snapshot()
             with PROCESSING_TIME.time():
-                REQUESTS_TOTAL.inc()
+                _inc_requests()
                 detection_result = detector.detect(features)
                 result = detection_result.to_dict()
                 # increment counters per threat (with required labels)
-                for t in result.get("threat_types", []):
-                    confidence = result.get("confidence", 0.0)
-                    confidence_level = "high" if confidence > 0.7 else "medium" if confidence > 0.4 else "low"
-                    THREATS_DETECTED.labels(
-                        threat_type=t, 
-                        confidence_level=confidence_level,
-                        source_ip="prometheus_query"
-                    ).inc()
-                return jsonify({"features": features, "result": result})
+                confidence_level = _confidence_level(result.get("confidence", 0.0))
+                record_threats(
+                    result.get("threat_types", []), confidence_level, "prometheus_query"
+                )
+                return _json({"features": features, "result": result})
         except Exception as e:
             logger.error(f"Prometheus detection error: {e}")
-            return jsonify({"error": str(e)}), 500
+            return _json({"error": str(e)}, 500)
 
     @api.route("/")
     def root() -> Response:
-        return jsonify(
+        return _json(
             {
                 "service": "ML Detector",
                 "version": "2.0.0",
@@ -208,8 +354,10 @@ def create_api(detector: ThreatDetector) -> Blueprint:
                     "health": "/health",
                     "metrics": "/metrics", 
                     "detect": "/detect (POST)",
+                    "detect_batch": "/detect/batch (POST)",
                     "detect_from_prom": "/detect/prom (GET|POST)",
                     "detect_user": "/detect/user (POST)",
+                    "detect_user_batch": "/detect/user/batch (POST)",
                     "detect_process": "/detect/process (POST)",
                     "train": "/train (POST)",
                     "stats": "/stats",
@@ -9,20 +9,40 @@ from __future__ import annotations
 
 import logging
 import os
+from typing import Any, Optional
+
+import orjson
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 
 from api import create_api
 from threat_detector import ThreatDetector
 
 
-def create_app() -> Flask:
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, for jsonify() and get_json()."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+def create_app(detector: Optional[ThreatDetector] = None) -> Flask:
     """
     Create and configure Flask application.
     
+    Args:
+        detector: Shared ThreatDetector; a new, started one is built if omitted
+    
     Returns:
         Configured Flask app with all blueprints registered
     """
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
 
     # Security configuration
     app.config["MAX_CONTENT_LENGTH"] = int(
@@ -36,7 +56,8 @@ def create_app() -> Flask:
     )
 
     # Initialize core threat detection system
-    detector = ThreatDetector()
+    if detector is None:
+        detector = ThreatDetector()
     
     # Register API blueprint
     api_bp = create_api(detector)
@@ -49,15 +70,15 @@ def create_app() -> Flask:
             "status": "healthy",
             "service": "ml-detector-refactored",
             "version": "3.0.0",
-            "models": {
-                "spatial": detector.spatial_detector.is_trained(),
-                "temporal": detector.temporal_detector.is_trained(),
-                "statistical": detector.statistical_detector.is_trained()
-            }
+            "models": detector.models_trained()
         }
     
     return app
 
 
-# WSGI entrypoint for Gunicorn
-app = create_app()
+# WSGI entrypoint for Gunicorn. The detector is built at import time so that
+# with preload_app the master loads the persisted models once and workers
+# share them copy-on-write; under gunicorn.conf.py each worker then calls
+# detector.start(). Any other server gets an already started detector.
+detector = ThreatDetector(start=os.getenv("ML_DETECTOR_WORKER_START") != "1")
+app = create_app(detector)
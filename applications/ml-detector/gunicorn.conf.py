@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for ML Detector.
+
+Threaded (gthread) workers let I/O-bound requests such as /detect/prom,
+which mostly wait on Prometheus, overlap inside a single worker process
+instead of serializing per worker. All values can be tuned via env.
+"""
+import os
+
+# Per-request inference runs on 1xN inputs, where BLAS/OpenMP/TensorFlow
+# thread pools only add wakeups and oversubscribe the CPU across gthread
+# workers; use one thread each and scale with workers. Set here because
+# this file is read before the app (and numpy) is imported.
+for _var in (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+):
+    os.environ.setdefault(_var, "1")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Import the app (and its persisted models) once in the master; forked
+# workers share the loaded arrays instead of each deserializing them.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+# Tells app.py that post_worker_init below starts the detector in each
+# worker; any other server (flask run, gunicorn without -c) starts it on import.
+os.environ["ML_DETECTOR_WORKER_START"] = "1"
+
+
+def post_worker_init(worker):
+    """Load the VAE and start background training inside each worker."""
+    from app import detector
+
+    detector.start()
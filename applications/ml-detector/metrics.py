@@ -1,6 +1,12 @@
 from __future__ import annotations
 
 import os
+import queue
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Iterable
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 from prometheus_client import CollectorRegistry
 
@@ -20,6 +26,91 @@ THREATS_DETECTED = Counter(
     ["threat_type", "confidence_level", "source_ip"]
 )
 
+
+@lru_cache(maxsize=4096)
+def threat_counter(threat_type: str, confidence_level: str, source_ip: str) -> Counter:
+    """Return the THREATS_DETECTED child for a label tuple, memoized.
+
+    Skips prometheus_client's kwargs-to-tuple conversion and child lookup
+    on every emission; children are never removed, so caching is safe.
+    """
+    return THREATS_DETECTED.labels(
+        threat_type=threat_type, confidence_level=confidence_level, source_ip=source_ip
+    )
+
+
+# Threat increments are handed to a per-process drainer thread so detect
+# routes do not take prometheus_client's per-child locks before responding
+_threat_queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+_drainer_lock = threading.Lock()
+_drainer_pid = None
+
+
+def _drain_threats() -> None:
+    """Apply queued threat increments, coalescing whatever is already queued."""
+    while True:
+        batch = [_threat_queue.get()]
+        while True:
+            try:
+                batch.append(_threat_queue.get_nowait())
+            except queue.Empty:
+                break
+        counts = {}
+        for threat_types, confidence_level, source in batch:
+            for t in threat_types:
+                key = (t, confidence_level, source)
+                counts[key] = counts.get(key, 0) + 1
+        for key, n in counts.items():
+            threat_counter(*key).inc(n)
+
+
+def record_threats(
+    threat_types: Iterable[str], confidence_level: str, source: str
+) -> None:
+    """Queue one THREATS_DETECTED increment per threat type.
+
+    The drainer is started lazily and per process id, so it also runs in
+    gunicorn workers forked from a preloaded master.
+    """
+    global _drainer_pid
+    if not threat_types:
+        return
+    if _drainer_pid != os.getpid():
+        with _drainer_lock:
+            if _drainer_pid != os.getpid():
+                threading.Thread(
+                    target=_drain_threats, name="threat_metrics", daemon=True
+                ).start()
+                _drainer_pid = os.getpid()
+    _threat_queue.put((tuple(threat_types), confidence_level, source))
+
+
+# Free-form sources (user ids, process names) are folded into this many
+# stable buckets so THREATS_DETECTED cannot grow a child per distinct value
+SOURCE_BUCKETS = 64
+
+
+def bucket_source(source: str, kind: str) -> str:
+    """Map a high-cardinality source to a stable ``"<kind>:<n>"`` label value.
+
+    Uses crc32 rather than hash() so every worker process (and restart)
+    agrees on the bucket for a given source.
+    """
+    return f"{kind}:{zlib.crc32(source.encode()) % SOURCE_BUCKETS}"
+
+
+def ip_subnet(ip: str) -> str:
+    """Map a source IP to its IPv4 /24 for the per-IP gauges' ``source_ip`` label.
+
+    Anything that is not dotted IPv4 (IPv6, hostnames) falls back to
+    bucket_source() so the label set stays bounded either way.
+    """
+    prefix, dot, _ = ip.rpartition(".")
+    if dot and prefix.count(".") == 2:
+        return f"{prefix}.0/24"
+    return bucket_source(ip, "ip")
+
+
 THREAT_CONFIDENCE = Histogram(
     "ml_detector_threat_confidence",
     "Confidence scores of detected threats",
@@ -75,18 +166,35 @@ FEATURE_VALUES = Gauge(
 )
 
 # IP-specific metrics for Grafana dashboards
+# Labelled by ip_subnet() rather than the raw address, so a scan from many
+# addresses cannot grow a child per IP
 IP_PACKET_COUNT = Gauge(
     "ml_detector_ip_packet_count",
-    "Packet count per source IP",
+    "Packet count per source /24 subnet",
     ["source_ip"]
 )
 
 SUSPICIOUS_IP_ACTIVITY = Gauge(
     "ml_detector_suspicious_ip_activity",
-    "Suspicious activity level per IP (0-1)",
+    "Suspicious activity level per source /24 subnet (0-1)",
     ["source_ip", "activity_type"]
 )
 
+
+@lru_cache(maxsize=4096)
+def ip_packet_gauge(source_ip: str) -> Gauge:
+    """Return the IP_PACKET_COUNT child for an ip_subnet() label, memoized."""
+    return IP_PACKET_COUNT.labels(source_ip=source_ip)
+
+
+@lru_cache(maxsize=4096)
+def suspicious_ip_gauge(source_ip: str, activity_type: str) -> Gauge:
+    """Return the SUSPICIOUS_IP_ACTIVITY child for a label pair, memoized."""
+    return SUSPICIOUS_IP_ACTIVITY.labels(
+        source_ip=source_ip, activity_type=activity_type
+    )
+
+
 THREAT_SEVERITY = Gauge(
     "ml_detector_threat_severity",
     "Current threat severity level (0-1)",
@@ -157,3 +265,22 @@ def generate_metrics_payload() -> bytes:
         return generate_latest(registry)
     return generate_latest()
 
+
+# Serialized payload shared by scrapes within METRICS_CACHE_TTL seconds
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "1.0"))
+_payload_lock = threading.Lock()
+_payload_cache = {"bytes": b"", "ts": float("-inf")}
+
+
+def cached_metrics_payload(ttl: float = METRICS_CACHE_TTL) -> bytes:
+    """Return the metrics payload, regenerating it at most once per ``ttl``.
+
+    Concurrent scrapes inside the window share a single serialization.
+    """
+    if time.monotonic() - _payload_cache["ts"] <= ttl:
+        return _payload_cache["bytes"]
+    with _payload_lock:
+        if time.monotonic() - _payload_cache["ts"] > ttl:
+            _payload_cache["bytes"] = generate_metrics_payload()
+            _payload_cache["ts"] = time.monotonic()
+        return _payload_cache["bytes"]
@@ -46,6 +46,12 @@ class BaseRuleEngine(ABC):
         """Apply rules and return list of (threat_type, confidence) tuples."""
         pass
     
+    def detect_batch(
+        self, records: List[Dict[str, float]]
+    ) -> List[List[Tuple[str, float]]]:
+        """Apply rules to many records (engines override with a vectorized pass)."""
+        return [self.detect(data) for data in records]
+    
     @abstractmethod
     def get_supported_data_types(self) -> List[str]:
         """Return list of supported data types: ['network', 'authentication', 'qos']."""
@@ -0,0 +1,31 @@
+"""
+Ensemble state for the ML detection models.
+
+Keeps the models and their trained flags as parallel arrays so the
+orchestrator and the API read every model's state in one pass instead of
+calling into each detector.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .base import BaseDetectionModel
+
+
+class Ensemble:
+    """Detection models with a trained-flag array aligned by index."""
+
+    def __init__(self, models: Dict[str, BaseDetectionModel]):
+        self.names: Tuple[str, ...] = tuple(models)
+        self.models: Tuple[BaseDetectionModel, ...] = tuple(models.values())
+        self.trained = np.zeros(len(self.models), dtype=bool)
+
+    def refresh(self) -> None:
+        """Re-read every model's trained flag (after load or training)."""
+        self.trained = np.array(
+            [model.is_trained() for model in self.models], dtype=bool
+        )
+
+    def trained_dict(self) -> Dict[str, bool]:
+        """Trained flags keyed by model name."""
+        return dict(zip(self.names, self.trained.tolist(), strict=True))
@@ -8,8 +8,9 @@ import logging
 import numpy as np
 import joblib
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import BallTree
 from sklearn.preprocessing import StandardScaler
-from typing import Optional
+from typing import Optional, Tuple
 
 from .base import BaseDetectionModel
 from constants import DBSCAN_CONFIG
@@ -29,6 +30,11 @@ class SpatialAnomalyDetector(BaseDetectionModel):
         self.scaler = StandardScaler()
         self._is_trained = False
         self._training_data: Optional[np.ndarray] = None
+        
+        # (BallTree, labels, cluster sizes) over the training clusters, rebuilt
+        # on fit/load and swapped in as one tuple so predict() sees a
+        # consistent snapshot while the background trainer refits
+        self._index: Optional[Tuple[BallTree, np.ndarray, np.ndarray]] = None
     
     def fit(self, data: np.ndarray) -> None:
         """Train DBSCAN on provided data."""
@@ -39,11 +45,15 @@ class SpatialAnomalyDetector(BaseDetectionModel):
             
             # Scale features
             self.scaler.fit(data)
-            scaled_data = self.scaler.transform(data)
+            # float32, C-contiguous: half the bytes to keep and persist
+            scaled_data = np.ascontiguousarray(
+                self.scaler.transform(data), dtype=np.float32
+            )
             
             # Fit DBSCAN
             self.dbscan.fit(scaled_data)
             self._training_data = scaled_data
+            self._build_index()
             self._is_trained = True
             
             logger.info(f"DBSCAN trained on {len(data)} samples")
@@ -53,28 +63,30 @@ class SpatialAnomalyDetector(BaseDetectionModel):
     
     def predict(self, features: np.ndarray) -> float:
         """Predict anomaly score using DBSCAN clustering."""
-        if not self._is_trained or self._training_data is None:
+        index = self._index
+        if not self._is_trained or index is None:
             return 0.0
         
         try:
             # Scale input features
-            scaled_features = self.scaler.transform(features)
-            
-            # Combine with training data for clustering
-            combined_data = np.vstack([self._training_data[-100:], scaled_features])
-            
-            # Apply DBSCAN clustering
-            clusters = self.dbscan.fit_predict(combined_data)
+            scaled_features = self.scaler.transform(features).astype(
+                np.float32, copy=False
+            )
             
-            # Current sample is the last point
-            current_cluster = clusters[-1]
+            # Training points within eps of the sample
+            tree, labels, cluster_sizes = index
+            k = min(self.dbscan.min_samples, len(labels))
+            dist, idx = tree.query(scaled_features, k=k)
+            neighbors = idx[0][dist[0] <= self.dbscan.eps]
+            neighbor_labels = labels[neighbors]
+            neighbor_labels = neighbor_labels[neighbor_labels != -1]
             
-            if current_cluster == -1:  # Outlier detected
+            if neighbor_labels.size == 0:  # Outlier detected
                 return 0.9
             
-            # Calculate cluster density score
-            cluster_size = np.sum(clusters == current_cluster)
-            cluster_ratio = cluster_size / len(combined_data)
+            # Calculate density score of the cluster the sample falls into
+            current_cluster = np.bincount(neighbor_labels).argmax()
+            cluster_ratio = cluster_sizes[current_cluster] / len(labels)
             
             # Smaller clusters = higher anomaly score
             anomaly_score = max(0.0, 1.0 - cluster_ratio * 2)
@@ -113,10 +125,30 @@ class SpatialAnomalyDetector(BaseDetectionModel):
             self.scaler = saved_data['scaler']
             self._training_data = saved_data['training_data']
             self._is_trained = saved_data['is_trained']
+            if self._training_data is not None:
+                self._build_index()
+                # Loaded state is only ever replaced by fit(), never written
+                # in place; freezing it keeps preloaded pages shared across
+                # forked workers
+                self._training_data.setflags(write=False)
+                self.scaler.mean_.setflags(write=False)
+                self.scaler.scale_.setflags(write=False)
             
             logger.info("Spatial model loaded successfully")
             return True
             
         except Exception as e:
             logger.warning(f"Could not load spatial model: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _build_index(self) -> None:
+        """Index the clustered training data for nearest-neighbor lookups.
+        
+        predict() asks "does the sample land within eps of a clustered
+        training point?" instead of re-running DBSCAN per request.
+        """
+        labels = self.dbscan.labels_
+        cluster_sizes = np.bincount(
+            labels[labels != -1], minlength=int(labels.max()) + 1
+        )
+        self._index = (BallTree(self._training_data), labels, cluster_sizes)
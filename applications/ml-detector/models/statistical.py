@@ -6,8 +6,7 @@ median absolute deviation, as used by Rakuten Symphony.
 """
 import logging
 import numpy as np
-from collections import deque
-from typing import Deque
+from typing import Optional, Tuple
 
 from .base import BaseDetectionModel
 from constants import WINDOW_SIZES
@@ -19,19 +18,35 @@ class StatisticalAnomalyDetector(BaseDetectionModel):
     """ZMAD-based statistical anomaly detection (Rakuten Symphony approach)."""
     
     def __init__(self):
-        self.historical_data: Deque[np.ndarray] = deque(maxlen=WINDOW_SIZES["all_data"])
+        # Fixed-capacity float32 ring buffer holding the history window
+        # (allocated on first fit, once the feature width is known)
+        self._capacity = WINDOW_SIZES["all_data"]
+        self._ring: Optional[np.ndarray] = None
+        self._head = 0
+        self._size = 0
+        
+        # Medians/MAD are only recomputed when the history has changed.
+        # Cached as one (version, medians, scale) tuple, published with a
+        # single assignment so a concurrent predict() never pairs a new
+        # scale with old medians.
+        self._version = 0
+        self._zmad: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        
         self._is_trained = False
     
     def fit(self, data: np.ndarray) -> None:
         """Add data to historical window (no actual training needed)."""
         try:
-            for sample in data:
-                self.historical_data.append(sample)
+            self._append(np.asarray(data, dtype=np.float32))
+            # Refresh medians/MAD here, on the training thread, so predict()
+            # only reads the cached arrays
+            if self._size:
+                self._zmad_params()
             
             # Mark as trained when we have sufficient history
-            if len(self.historical_data) >= 30:
+            if self._size >= 30:
                 self._is_trained = True
-                logger.info(f"Statistical detector ready with {len(self.historical_data)} samples")
+                logger.info(f"Statistical detector ready with {self._size} samples")
                 
         except Exception as e:
             logger.error(f"Statistical model update error: {e}")
@@ -42,21 +57,13 @@ class StatisticalAnomalyDetector(BaseDetectionModel):
             return 0.0
         
         try:
-            current_features = features[0]
-            historical_array = np.array(list(self.historical_data))
+            current_features = features[0].astype(np.float32, copy=False)
+            medians, scale = self._zmad_params()
             
-            # VECTORIZED ZMAD calculation (much faster than loops)
-            medians = np.median(historical_array, axis=0)
-            mad_values = np.median(np.abs(historical_array - medians), axis=0)
-            
-            # Avoid division by zero (vectorized)
-            mad_values = np.where(mad_values == 0, 0.001, mad_values)
-            
-            # Calculate Modified Z-Score for all features at once
-            zmad_scores = 0.6745 * (current_features - medians) / mad_values
-            
-            # Convert to anomaly scores (vectorized)
-            anomaly_scores = np.minimum(np.abs(zmad_scores) / 3.5, 1.0)
+            # Modified Z-Score / 3.5 for all features at once, capped at 1
+            anomaly_scores = np.minimum(
+                np.abs((current_features - medians) * scale), 1.0
+            )
             
             # Return average ZMAD-based anomaly score
             return float(np.mean(anomaly_scores))
@@ -65,6 +72,83 @@ class StatisticalAnomalyDetector(BaseDetectionModel):
             logger.warning(f"ZMAD prediction error: {e}")
             return 0.0
     
+    def predict_batch(self, features_matrix: np.ndarray) -> np.ndarray:
+        """Score every row of an (N, D) matrix with a single median/MAD pass."""
+        if not self._is_trained:
+            return np.zeros(len(features_matrix))
+        
+        try:
+            medians, scale = self._zmad_params()
+            features_matrix = features_matrix.astype(np.float32, copy=False)
+            scores = np.minimum(np.abs((features_matrix - medians) * scale), 1.0)
+            return np.mean(scores, axis=1)
+            
+        except Exception as e:
+            logger.warning(f"ZMAD batch prediction error: {e}")
+            return np.zeros(len(features_matrix))
+    
+    def _zmad_params(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return per-feature medians and the folded ZMAD scale.
+        
+        The scale is ``0.6745 / (3.5 * MAD)`` (zero MAD replaced), so a
+        feature's anomaly score is ``min(|x - median| * scale, 1)``.
+        Recomputed eagerly by fit() and cached, so predictions skip the
+        O(N·D) median passes; recomputes lazily if the history changed since.
+        """
+        version = self._version
+        params = self._zmad
+        if params is None or params[0] != version:
+            # Row order is irrelevant for medians, so the raw buffer is used as-is
+            historical_array = self._ring[:self._size]
+            
+            # VECTORIZED ZMAD calculation (much faster than loops)
+            medians = np.median(historical_array, axis=0)
+            deviations = np.subtract(historical_array, medians)
+            np.abs(deviations, out=deviations)
+            mad_values = np.median(deviations, axis=0, overwrite_input=True)
+            
+            # Avoid division by zero (vectorized)
+            mad_values = np.where(mad_values == 0, 0.001, mad_values)
+            params = (version, medians, 0.6745 / (3.5 * mad_values))
+            self._zmad = params
+        return params[1], params[2]
+    
+    def _append(self, rows: np.ndarray) -> None:
+        """Write rows into the ring buffer, evicting the oldest when full."""
+        if rows.ndim != 2 or len(rows) == 0:
+            return
+        if self._ring is None or self._ring.shape[1] != rows.shape[1]:
+            if self._ring is not None:
+                logger.warning("Feature width changed, resetting statistical history")
+            self._ring = np.empty((self._capacity, rows.shape[1]), dtype=rows.dtype)
+            self._head = 0
+            self._size = 0
+        
+        capacity = self._capacity
+        if len(rows) >= capacity:
+            self._ring[:] = rows[-capacity:]
+            self._head = 0
+            self._size = capacity
+        else:
+            end = self._head + len(rows)
+            if end <= capacity:
+                self._ring[self._head:end] = rows
+            else:
+                split = capacity - self._head
+                self._ring[self._head:] = rows[:split]
+                self._ring[:end - capacity] = rows[split:]
+            self._head = end % capacity
+            self._size = min(self._size + len(rows), capacity)
+        self._version += 1
+    
+    def _ordered_history(self) -> np.ndarray:
+        """Return a copy of the history, oldest sample first."""
+        if self._ring is None:
+            return np.empty((0, 0))
+        if self._size < self._capacity:
+            return self._ring[:self._size].copy()
+        return np.concatenate((self._ring[self._head:], self._ring[:self._head]))
+    
     def is_trained(self) -> bool:
         """Check if statistical detector has sufficient history."""
         return self._is_trained
@@ -74,7 +158,7 @@ class StatisticalAnomalyDetector(BaseDetectionModel):
         try:
             import joblib
             joblib.dump({
-                'historical_data': list(self.historical_data),
+                'historical_data': list(self._ordered_history()),
                 'is_trained': self._is_trained
             }, f"{path}/statistical_model.pkl")
             logger.info("Statistical model data saved successfully")
@@ -93,8 +177,12 @@ class StatisticalAnomalyDetector(BaseDetectionModel):
             saved_data = joblib.load(f"{path}/statistical_model.pkl")
             
             # Restore historical data
-            self.historical_data = deque(saved_data['historical_data'], 
-                                       maxlen=WINDOW_SIZES["all_data"])
+            self._ring = None
+            self._size = 0
+            if len(saved_data['historical_data']):
+                self._append(
+                    np.asarray(saved_data['historical_data'], dtype=np.float32)
+                )
             self._is_trained = saved_data['is_trained']
             
             logger.info("Statistical model data loaded successfully")
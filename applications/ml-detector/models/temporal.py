@@ -5,9 +5,14 @@ This module implements VAE-based sequential analysis for detecting
 anomalies in time-series patterns.
 """
 import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
-from collections import deque
-from typing import Deque, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Callable, Optional
 # Lazy import for faster startup
 tf = None
 keras = None
@@ -21,12 +26,114 @@ def _ensure_tensorflow():
         tf = _tf
         keras = _keras
 
+_Sampling = None
+
+def _sampling_layer():
+    """Return the VAE sampling layer class, defined once TensorFlow is loaded.
+    
+    Module-level and registered so every VAE shares one class and
+    load_model() revives it as a real layer instead of a generic wrapper.
+    """
+    global _Sampling
+    if _Sampling is None:
+        _ensure_tensorflow()
+        
+        @keras.utils.register_keras_serializable(package="ml_detector")
+        class Sampling(keras.layers.Layer):
+            """Reparameterization trick: z = z_mean + exp(z_log_var / 2) * epsilon."""
+            
+            def call(self, inputs):
+                z_mean, z_log_var = inputs
+                epsilon = tf.random.normal(shape=tf.shape(z_mean))
+                return z_mean + tf.exp(0.5 * z_log_var) * epsilon
+        
+        _Sampling = Sampling
+    return _Sampling
+
+def _fused_lstm(units: int, return_sequences: bool):
+    """LSTM layer pinned to the cuDNN-eligible configuration.
+    
+    Keras only dispatches to the fused cuDNN kernel on GPU when every one
+    of these matches; spelling them out keeps a default change in a
+    future TF release from silently falling back to the generic step loop.
+    """
+    return keras.layers.LSTM(
+        units,
+        return_sequences=return_sequences,
+        activation="tanh",
+        recurrent_activation="sigmoid",
+        use_bias=True,
+        unroll=False,
+        dropout=0.0,
+        recurrent_dropout=0.0,
+    )
+
 from .base import BaseDetectionModel
 from constants import VAE_CONFIG, WINDOW_SIZES
 
 logger = logging.getLogger(__name__)
 
 
+class _InferenceBatcher:
+    """
+    Background thread that scores queued sequences with one batched call.
+    
+    Each batch takes whatever is already queued (up to ``max_batch``) and
+    waits at most ``max_wait`` seconds for more. With the default wait of
+    0 a lone request goes straight through and batching only happens when
+    requests pile up behind a running forward pass. The thread is started
+    lazily and per process id, so it also runs in forked workers.
+    """
+    
+    def __init__(
+        self, score: Callable[[np.ndarray], np.ndarray], max_batch: int, max_wait: float
+    ):
+        self._score = score
+        self.max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pid = None
+    
+    def submit(self, sequence: np.ndarray) -> "Future[float]":
+        """Queue a (1, seq_len, features) sequence; the future yields its score."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    threading.Thread(
+                        target=self._run, name="vae_batcher", daemon=True
+                    ).start()
+                    self._pid = os.getpid()
+        future: "Future[float]" = Future()
+        # Copy: the caller's buffer is reused by its next request
+        self._queue.put((sequence.copy(), future))
+        return future
+    
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                scores = self._score(
+                    np.concatenate([sequence for sequence, _ in batch])
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), score in zip(batch, scores.tolist(), strict=True):
+                future.set_result(score)
+
+
 class TemporalAnomalyDetector(BaseDetectionModel):
     """VAE-based temporal anomaly detection (Rakuten Symphony approach)."""
     
@@ -34,37 +141,124 @@ class TemporalAnomalyDetector(BaseDetectionModel):
         self.sequence_length = VAE_CONFIG["sequence_length"]
         self.vae: Optional[keras.Model] = None
         self._is_trained = False
+        # XLA-compiled forward pass over self.vae, built on first predict
+        self._predict_fn = None
+        self._predict_batch_fn = None
+        # Directory a saved model was loaded from; the trainable Keras model
+        # is only restored from it when fit() first needs it
+        self._loaded_from: Optional[str] = None
+        self._inference_module = None
+        # Per-thread (1, seq_len, features) float32 input buffer for predict()
+        self._tls = threading.local()
+        # Concurrent predict() calls are funnelled through one batching
+        # thread; VAE_BATCH_MAX=1 keeps inference on the calling thread
+        batch_max = int(os.getenv("VAE_BATCH_MAX", "32"))
+        batch_wait = float(os.getenv("VAE_BATCH_WAIT_MS", "0")) / 1000
+        self._batcher = _InferenceBatcher(
+            self.predict_batch, batch_max, batch_wait
+        ) if batch_max > 1 else None
         
-        # Sequence management
-        self.current_sequence: Deque[np.ndarray] = deque(maxlen=self.sequence_length)
-        self.time_series_window: Deque[np.ndarray] = deque(maxlen=WINDOW_SIZES["time_series"])
+        # Sequence management: one float32 ring of recent samples. The
+        # current sequence is its last sequence_length rows and the
+        # training windows are sliding views over it, so overlapping
+        # sequences are never materialized per sample.
+        self._capacity = WINDOW_SIZES["time_series"] + self.sequence_length - 1
+        self._samples: Optional[np.ndarray] = None
+        self._head = 0      # next write slot
+        self._filled = 0    # valid rows in the ring
+        self._ring_lock = threading.Lock()
     
     def add_sample(self, features: np.ndarray) -> None:
         """Add a new sample to the current sequence."""
-        self.current_sequence.append(features[0])
+        with self._ring_lock:
+            self._append(features[:1])
+    
+    def add_samples(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Add every (features) row of ``rows`` to the sequence and return the
+        complete sequences ending at them, oldest first.
         
-        # When sequence is complete, add to time series window
-        if len(self.current_sequence) == self.sequence_length:
-            self.time_series_window.append(np.array(list(self.current_sequence)))
+        Appending and reading happen in one critical section, so samples
+        added concurrently by other threads cannot shift the result.
+        """
+        with self._ring_lock:
+            self._append(rows)
+            history = self._history(len(rows))
+        return self._windows(history)
+    
+    def _append(self, rows: np.ndarray) -> None:
+        """Write rows into the ring; the caller holds _ring_lock."""
+        width = rows.shape[1]
+        if self._samples is None or self._samples.shape[1] != width:
+            if self._samples is not None:
+                logger.warning("Feature width changed, resetting temporal history")
+            self._samples = np.zeros((self._capacity, width), dtype=np.float32)
+            self._head = 0
+            self._filled = 0
+        # Only the newest capacity rows survive; assignment copies, so
+        # callers may reuse their feature buffer
+        rows = rows[-self._capacity:]
+        n = len(rows)
+        self._samples[np.arange(self._head, self._head + n) % self._capacity] = rows
+        self._head = (self._head + n) % self._capacity
+        self._filled = min(self._filled + n, self._capacity)
+    
+    @property
+    def time_series_window(self) -> np.ndarray:
+        """Complete sequences seen so far, oldest first, as (N, seq_len, features)."""
+        return self._recent_windows()
+    
+    def _recent_windows(self, limit: Optional[int] = None) -> np.ndarray:
+        """
+        The newest ``limit`` complete sequences (all when None), oldest
+        first. Only the samples those sequences cover are copied out of
+        the ring.
+        """
+        with self._ring_lock:
+            history = self._history(limit)
+        return self._windows(history)
+    
+    def _history(self, limit: Optional[int]) -> Optional[np.ndarray]:
+        """
+        Copy of the samples covered by the newest ``limit`` sequences, or
+        None before a full sequence exists; the caller holds _ring_lock.
+        """
+        if self._samples is None or self._filled < self.sequence_length:
+            return None
+        count = self._filled
+        if limit is not None:
+            count = min(count, limit + self.sequence_length - 1)
+        idx = np.arange(self._head - count, self._head) % self._capacity
+        return self._samples[idx]
+    
+    def _windows(self, history: Optional[np.ndarray]) -> np.ndarray:
+        """(N, seq_len, features) sliding views over a _history() copy."""
+        if history is None:
+            return np.empty((0, self.sequence_length, 0), dtype=np.float32)
+        windows = sliding_window_view(history, self.sequence_length, axis=0)
+        return windows.transpose(0, 2, 1)
     
     def fit(self, data: np.ndarray) -> None:
         """Train VAE on sequential data."""
         try:
-            if len(self.time_series_window) < 50:
+            # Only the newest 200 sequences are trained on
+            windows = self._recent_windows(200)
+            if len(windows) < 50:
                 logger.warning("Insufficient sequences for VAE training")
                 return
             
             # Load TensorFlow only when actually needed
             _ensure_tensorflow()
             
-            # Build VAE if not exists
+            # Restore or build VAE if not exists
             if self.vae is None:
-                input_dim = len(data[0])
-                self.vae = self._build_vae(input_dim)
+                self.vae = self._restore_keras_model() or self._build_vae(len(data[0]))
+                self._predict_fn = None
+                self._predict_batch_fn = None
+                self._inference_module = None
             
             # Prepare training sequences
-            sequences = list(self.time_series_window)[-200:]
-            X_train = np.array(sequences)
+            X_train = np.ascontiguousarray(windows)
             
             # Validate shapes before training
             if len(X_train.shape) != 3:
@@ -80,64 +274,191 @@ class TemporalAnomalyDetector(BaseDetectionModel):
                         batch_size=max(1, batch_size), 
                         verbose=0)
             self._is_trained = True
+            self._warmup()
             
-            logger.info(f"VAE trained on {len(sequences)} sequences")
+            logger.info(f"VAE trained on {len(X_train)} sequences")
             
         except Exception as e:
             logger.error(f"VAE training error: {e}")
     
     def predict(self, features: np.ndarray) -> float:
         """Predict anomaly score using VAE reconstruction error."""
-        if not self._is_trained or self.vae is None:
+        if not self._is_trained:
             return 0.0
         
         try:
             _ensure_tensorflow()
             # Need full sequence for prediction
-            if len(self.current_sequence) < self.sequence_length:
+            sequence = self._sequence_input()
+            if sequence is None:
                 return 0.0
-            
-            # Prepare sequence for VAE
-            sequence = np.array([list(self.current_sequence)])
+            if self._batcher is not None:
+                return self._batcher.submit(sequence).result()
             
             # Get reconstruction
-            reconstruction = self.vae.predict(sequence, verbose=0)
+            predict_fn = self._get_predict_fn()
+            reconstruction = predict_fn(tf.constant(sequence, dtype=tf.float32)).numpy()
             
-            # Calculate reconstruction error (MSE)
-            mse = np.mean(np.square(sequence - reconstruction))
+            # Calculate reconstruction error (MSE) in place: the input buffer
+            # is this thread's scratch and is refilled on the next call
+            np.subtract(sequence, reconstruction, out=sequence)
+            np.square(sequence, out=sequence)
+            mse = float(sequence.mean())
             
-            # Normalize to 0-1 range
-            anomaly_score = min(mse / 0.1, 1.0)
-            
-            return float(anomaly_score)
+            # Normalize to 0-1 range (mse / 0.1, capped at 1)
+            return 1.0 if mse >= 0.1 else mse * 10.0
             
         except Exception as e:
             logger.warning(f"VAE prediction error: {e}")
             return 0.0
     
+    def predict_batch(self, sequences: np.ndarray) -> np.ndarray:
+        """
+        Score many (seq_len, features) sequences with a single VAE call.
+        
+        The batch is zero-padded up to the next power of two so XLA only
+        ever compiles a handful of batch shapes.
+        """
+        n = len(sequences)
+        if not self._is_trained or n == 0:
+            return np.zeros(n)
+        
+        try:
+            _ensure_tensorflow()
+            padded = 1 << (n - 1).bit_length()
+            batch = np.zeros((padded,) + sequences.shape[1:], dtype=np.float32)
+            batch[:n] = sequences
+            # A single sequence takes the concrete (1, seq_len, features) function
+            predict_fn = (
+                self._get_predict_fn() if n == 1 else self._get_predict_batch_fn()
+            )
+            reconstruction = predict_fn(tf.constant(batch)).numpy()
+            errors = batch[:n]
+            np.subtract(errors, reconstruction[:n], out=errors)
+            np.square(errors, out=errors)
+            return np.minimum(errors.mean(axis=(1, 2)) * 10.0, 1.0)
+            
+        except Exception as e:
+            logger.warning(f"VAE batch prediction error: {e}")
+            return np.zeros(n)
+    
+    def _sequence_input(self) -> Optional[np.ndarray]:
+        """
+        Copy the current sequence, oldest first, into this thread's reusable
+        (1, seq_len, features) input buffer; None until a full sequence exists.
+        """
+        with self._ring_lock:
+            if self._samples is None or self._filled < self.sequence_length:
+                return None
+            seq_len = self.sequence_length
+            n_features = self._samples.shape[1]
+            buf = getattr(self._tls, "input_buf", None)
+            if buf is None or buf.shape[2] != n_features:
+                buf = np.empty((1, seq_len, n_features), dtype=np.float32)
+                self._tls.input_buf = buf
+            idx = np.arange(self._head - seq_len, self._head) % self._capacity
+            np.take(self._samples, idx, axis=0, out=buf[0])
+        return buf
+    
+    def _get_predict_fn(self):
+        """
+        Return the XLA-compiled inference function for the current VAE.
+        
+        Keras predict() builds a data adapter and step loop on every call,
+        which dominates a single (1, seq_len, features) input. The fixed
+        input signature means the graph is traced and compiled only once,
+        and holding the concrete function skips tf.function's per-call
+        argument matching.
+        """
+        if self._predict_fn is None:
+            vae = self.vae
+            self._predict_fn = tf.function(
+                lambda x: vae(x, training=False),
+                jit_compile=True,
+                input_signature=[tf.TensorSpec(
+                    (1, self.sequence_length, vae.input_shape[-1]), tf.float32
+                )],
+            ).get_concrete_function()
+        return self._predict_fn
+    
+    def _get_predict_batch_fn(self):
+        """XLA-compiled inference over a (batch, seq_len, features) input."""
+        if self._predict_batch_fn is None:
+            vae = self.vae
+            self._predict_batch_fn = tf.function(
+                lambda x: vae(x, training=False),
+                jit_compile=True,
+                input_signature=[tf.TensorSpec(
+                    (None, self.sequence_length, vae.input_shape[-1]), tf.float32
+                )],
+            )
+        return self._predict_batch_fn
+    
+    def _warmup(self) -> None:
+        """
+        Run dummy forward passes so live requests skip tracing and XLA
+        compilation: the single-sequence function and, when batching, every
+        padded batch size the batcher can produce.
+        """
+        try:
+            predict_fn = self._get_predict_fn()
+            shape = tuple(predict_fn.structured_input_signature[0][0].shape[1:])
+            predict_fn(tf.zeros((1,) + shape, dtype=tf.float32))
+            if self._batcher is not None:
+                batch_fn = self._get_predict_batch_fn()
+                size = 2
+                while size < 2 * self._batcher.max_batch:
+                    batch_fn(tf.zeros((size,) + shape, dtype=tf.float32))
+                    size *= 2
+        except Exception as e:
+            logger.warning(f"VAE warmup failed: {e}")
+    
     def is_trained(self) -> bool:
         """Check if VAE is trained and ready."""
         return self._is_trained
     
     def save(self, path: str) -> None:
-        """Save VAE model."""
+        """
+        Save VAE model.
+        
+        Writes the trainable Keras model (vae_model) and an inference-only
+        SavedModel (vae_infer) holding just the compiled forward pass, with
+        no optimizer or loss state, for fast loading on startup.
+        """
         try:
             if self.vae is not None:
                 self.vae.save(f"{path}/vae_model")
+                module = tf.Module()
+                module.vae = self.vae  # track the weights the function reads
+                module.infer = self._get_predict_batch_fn()
+                tf.saved_model.save(module, f"{path}/vae_infer")
                 logger.info("Temporal VAE model saved successfully")
         except Exception as e:
             logger.error(f"Error saving VAE model: {e}")
     
     def load(self, path: str) -> bool:
-        """Load VAE model."""
+        """
+        Load VAE model.
+        
+        Prefers the inference-only export; the trainable model is restored
+        lazily by the first fit(). Falls back to the Keras model alone.
+        """
         try:
-            import os
             if not os.path.exists(f"{path}/vae_model"):
                 return False
             
             _ensure_tensorflow()
-            self.vae = keras.models.load_model(f"{path}/vae_model")
+            self._loaded_from = path
+            if os.path.exists(f"{path}/vae_infer"):
+                # Keep the module referenced: its function reads the module's variables
+                self._inference_module = tf.saved_model.load(f"{path}/vae_infer")
+                self.vae = None
+                self._predict_batch_fn = self._inference_module.infer
+                self._predict_fn = self._predict_batch_fn.get_concrete_function()
+            else:
+                self.vae = self._restore_keras_model()
             self._is_trained = True
+            self._warmup()
             
             logger.info("Temporal VAE model loaded successfully")
             return True
@@ -146,37 +467,39 @@ class TemporalAnomalyDetector(BaseDetectionModel):
             logger.warning(f"Could not load VAE model: {e}")
             return False
     
+    def _restore_keras_model(self):
+        """Load the trainable Keras VAE saved alongside the loaded export, if any."""
+        if self._loaded_from is None:
+            return None
+        path, self._loaded_from = self._loaded_from, None
+        # Register Sampling first, or load_model() revives a generic wrapper
+        vae = keras.models.load_model(
+            f"{path}/vae_model", custom_objects={"Sampling": _sampling_layer()}
+        )
+        self._predict_fn = None
+        self._predict_batch_fn = None
+        return vae
+    
     def _build_vae(self, input_dim: int):
         """Build Variational Autoencoder architecture."""
         _ensure_tensorflow()
+        gpus = len(tf.config.list_physical_devices('GPU'))
+        logger.info(f"Building VAE (GPUs visible: {gpus})")
+        units = VAE_CONFIG["lstm_units"]
         # Encoder
         encoder_inputs = keras.Input(shape=(self.sequence_length, input_dim))
-        x = keras.layers.LSTM(VAE_CONFIG["lstm_units"][0], return_sequences=True)(encoder_inputs)
-        x = keras.layers.LSTM(VAE_CONFIG["lstm_units"][1], return_sequences=False)(x)
+        x = _fused_lstm(units[0], return_sequences=True)(encoder_inputs)
+        x = _fused_lstm(units[1], return_sequences=False)(x)
         z_mean = keras.layers.Dense(VAE_CONFIG["latent_dim"])(x)
         z_log_var = keras.layers.Dense(VAE_CONFIG["latent_dim"])(x)
         
         # Custom sampling layer for proper serialization
-        class SamplingLayer(keras.layers.Layer):
-            def __init__(self, **kwargs):
-                super().__init__(**kwargs)
-            
-            def call(self, inputs):
-                z_mean, z_log_var = inputs
-                batch = tf.shape(z_mean)[0]
-                dim = tf.shape(z_mean)[1]
-                epsilon = tf.random.normal(shape=(batch, dim))
-                return z_mean + tf.exp(0.5 * z_log_var) * epsilon
-            
-            def get_config(self):
-                return super().get_config()
-        
-        z = SamplingLayer()([z_mean, z_log_var])
+        z = _sampling_layer()()([z_mean, z_log_var])
         
         # Decoder
         decoder_input = keras.layers.RepeatVector(self.sequence_length)(z)
-        x = keras.layers.LSTM(VAE_CONFIG["lstm_units"][1], return_sequences=True)(decoder_input)
-        x = keras.layers.LSTM(VAE_CONFIG["lstm_units"][0], return_sequences=True)(x)
+        x = _fused_lstm(units[1], return_sequences=True)(decoder_input)
+        x = _fused_lstm(units[0], return_sequences=True)(x)
         decoder_outputs = keras.layers.TimeDistributed(
             keras.layers.Dense(input_dim, activation='linear')
         )(x)
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import os
 import time
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 class PrometheusSource:
@@ -18,9 +19,13 @@ class PrometheusSource:
     def __init__(self, base_url: Optional[str] = None, timeout: float = 5.0) -> None:
         self.base_url = base_url or os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
         self.timeout = timeout
-        # Optimized: Connection pooling for real-time performance
+        # Optimized: Connection pooling for real-time performance. Shallow
+        # copies (per-request overrides) share this session and its pool.
         self.session = requests.Session()
         self.session.headers.update({'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         # Metric names (override with env if your Prom deploy differs)
         self.m_packets = os.getenv("PROM_METRIC_PACKETS", "ebpf_packets_processed_total")
         self.m_bytes = os.getenv("PROM_METRIC_BYTES", "ebpf_bytes_processed_total")
@@ -28,49 +33,80 @@ class PrometheusSource:
         self.m_unique_ips = os.getenv("PROM_METRIC_UNIQUE_IPS", "")  # optional
         self.m_unique_ports = os.getenv("PROM_METRIC_UNIQUE_PORTS", "")  # optional
         self.window = os.getenv("PROM_QUERY_WINDOW", "1m")
+        # promql -> (fetched_at, result); shallow copies share it
+        self.cache_ttl = float(os.getenv("PROM_QUERY_CACHE_TTL", "5"))
+        self._cache: Dict[str, Tuple[float, list]] = {}
 
-    def _query(self, promql: str) -> float:
+    # Label used to tag each sub-expression of the combined snapshot query
+    FEATURE_LABEL = "ml_feature"
+
+    def _query(self, promql: str) -> list:
+        """Run an instant query and return its result vector ([] on failure).
+
+        Results are reused for ``cache_ttl`` seconds, so callers polling
+        within one scrape interval do not repeat the round-trip.
+        """
+        now = time.monotonic()
+        cached = self._cache.get(promql)
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            return cached[1]
+        result = self._fetch(promql)
+        if len(self._cache) >= 128:
+            for q, (fetched_at, _) in list(self._cache.items()):
+                if now - fetched_at >= self.cache_ttl:
+                    self._cache.pop(q, None)
+        self._cache[promql] = (now, result)
+        return result
+
+    def _fetch(self, promql: str) -> list:
         url = f"{self.base_url}/api/v1/query"
         resp = self.session.get(url, params={"query": promql, "time": str(time.time())}, timeout=self.timeout)
         resp.raise_for_status()
         data = resp.json()
         if data.get("status") != "success":
-            return 0.0
-        result = data.get("data", {}).get("result", [])
-        if not result:
-            return 0.0
-        # Use the first vector result (already aggregated)
-        val = result[0].get("value", [None, "0"])[1]
-        try:
-            return float(val)
-        except Exception:
-            return 0.0
+            return []
+        return data.get("data", {}).get("result", [])
 
     def snapshot(self) -> Dict[str, float]:
         # Rates per second
-        pps = self._query(f"sum(rate({self.m_packets}[{self.window}]))")
-        bps = self._query(f"sum(rate({self.m_bytes}[{self.window}]))")
-        tcp_packets = self._query(f"sum(rate({self.m_packets}{{protocol=\"tcp\"}}[{self.window}]))")
-        udp_packets = self._query(f"sum(rate({self.m_packets}{{protocol=\"udp\"}}[{self.window}]))")
+        window = self.window
+        queries = {
+            "packets_per_second": f"sum(rate({self.m_packets}[{window}]))",
+            "bytes_per_second": f"sum(rate({self.m_bytes}[{window}]))",
+            "tcp_packets": f"sum(rate({self.m_packets}{{protocol=\"tcp\"}}[{window}]))",
+            "udp_packets": f"sum(rate({self.m_packets}{{protocol=\"udp\"}}[{window}]))",
+        }
 
         # Optional metrics (best-effort)
-        syn = 0.0
         if self.m_syn:
-            syn = self._query(f"sum(rate({self.m_syn}[{self.window}]))")
-        uniq_ips = 0.0
+            queries["syn_packets"] = f"sum(rate({self.m_syn}[{window}]))"
         if self.m_unique_ips:
-            uniq_ips = self._query(f"avg_over_time({self.m_unique_ips}[{self.window}])")
-        uniq_ports = 0.0
+            queries["unique_ips"] = f"avg_over_time({self.m_unique_ips}[{window}])"
         if self.m_unique_ports:
-            uniq_ports = self._query(f"avg_over_time({self.m_unique_ports}[{self.window}])")
+            queries["unique_ports"] = f"avg_over_time({self.m_unique_ports}[{window}])"
+
+        # One round-trip: tag every expression with its feature name and
+        # "or" them together, then read the samples back by that label
+        promql = " or ".join(
+            f'label_replace({expr}, "{self.FEATURE_LABEL}", "{name}", "", "")'
+            for name, expr in queries.items()
+        )
+        values: Dict[str, float] = {}
+        for sample in self._query(promql):
+            name = sample.get("metric", {}).get(self.FEATURE_LABEL)
+            # Keep the first series per feature, as the single queries did
+            if name in queries and name not in values:
+                try:
+                    values[name] = float(sample.get("value", [None, "0"])[1])
+                except Exception:
+                    values[name] = 0.0
 
         return {
-            "packets_per_second": pps,
-            "bytes_per_second": bps,
-            "unique_ips": uniq_ips,
-            "unique_ports": uniq_ports,
-            "tcp_packets": tcp_packets,
-            "udp_packets": udp_packets,
-            "syn_packets": syn,
+            "packets_per_second": values.get("packets_per_second", 0.0),
+            "bytes_per_second": values.get("bytes_per_second", 0.0),
+            "unique_ips": values.get("unique_ips", 0.0),
+            "unique_ports": values.get("unique_ports", 0.0),
+            "tcp_packets": values.get("tcp_packets", 0.0),
+            "udp_packets": values.get("udp_packets", 0.0),
+            "syn_packets": values.get("syn_packets", 0.0),
         }
-
@@ -7,8 +7,11 @@ patterns like port scans, DDoS, data exfiltration, etc.
 import logging
 from typing import Dict, List, Tuple
 
+import numpy as np
+
 from models.base import BaseRuleEngine
 from constants import NETWORK_THRESHOLDS, QOS_THRESHOLDS, THREAT_CONFIDENCE_MAPPING
+from .vectorized import collect_threats, to_columns
 
 logger = logging.getLogger(__name__)
 
@@ -16,100 +19,152 @@ logger = logging.getLogger(__name__)
 class NetworkRuleEngine(BaseRuleEngine):
     """Rule-based detection for network traffic anomalies."""
     
+    def __init__(self):
+        # Thresholds captured once as flat attributes for the per-tick path
+        net, qos = NETWORK_THRESHOLDS, QOS_THRESHOLDS
+        self._t_port_scan_ports = float(net["port_scan"]["unique_ports"])
+        self._t_port_scan_pps = float(net["port_scan"]["packets_per_second"])
+        self._t_ddos_pps = float(net["ddos"]["packets_per_second"])
+        self._t_ddos_bps = float(net["ddos"]["bytes_per_second"])
+        self._t_exfil_bps = float(net["data_exfiltration"]["bytes_per_second"])
+        self._t_exfil_tcp_ratio = float(net["data_exfiltration"]["tcp_ratio"])
+        self._t_syn_packets = float(net["syn_flood"]["syn_packets"])
+        self._t_syn_tcp_ratio = float(net["syn_flood"]["tcp_ratio"])
+        self._t_max_latency = float(qos["latency_anomaly"]["max_latency_ms"])
+        self._t_avg_latency = float(qos["latency_anomaly"]["avg_latency_ms"])
+        self._t_jitter = float(qos["jitter_anomaly"]["jitter_ms"])
+        self._t_packet_loss = float(qos["packet_loss"]["packet_loss_rate"])
+        self._t_qos_latency = float(qos["qos_degradation"]["avg_latency_ms"])
+        self._t_qos_jitter = float(qos["qos_degradation"]["jitter_ms"])
+        self._t_qos_packet_loss = float(qos["qos_degradation"]["packet_loss_rate"])
+        
+        # Every network rule has a fixed confidence, so each threat tuple is
+        # built once and shared by all detections
+        confidence = THREAT_CONFIDENCE_MAPPING
+        self._port_scan_threat = ("port_scan", confidence["port_scan"])
+        self._ddos_threat = ("ddos", confidence["ddos"])
+        self._data_exfiltration_threat = (
+            "data_exfiltration", confidence["data_exfiltration"]
+        )
+        self._syn_flood_threat = ("syn_flood", confidence["syn_flood"])
+        self._latency_anomaly_threat = (
+            "latency_anomaly", confidence["latency_anomaly"]
+        )
+        self._jitter_anomaly_threat = ("jitter_anomaly", confidence["jitter_anomaly"])
+        self._packet_loss_threat = ("packet_loss", confidence["packet_loss"])
+        self._qos_degradation_threat = (
+            "qos_degradation", confidence["qos_degradation"]
+        )
+    
     def detect(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
         """Apply network traffic rules and return detected threats."""
         threats: List[Tuple[str, float]] = []
+        get = data.get
         
-        # Calculate derived metrics
-        tcp_packets = data.get("tcp_packets", 0)
-        udp_packets = data.get("udp_packets", 0)
-        total_packets = tcp_packets + udp_packets
-        tcp_ratio = tcp_packets / total_packets if total_packets > 0 else 0
+        # Read every feature once; the checks below are straight-line
+        pps = get("packets_per_second", 0)
+        bps = get("bytes_per_second", 0)
+        syn_packets = get("syn_packets", 0)
+        
+        # tcp_ratio only feeds the exfiltration and SYN flood checks, and each
+        # tests its cheap byte/SYN threshold first
+        tcp_ratio = 0.0
+        if bps > self._t_exfil_bps or syn_packets > self._t_syn_packets:
+            tcp_packets = get("tcp_packets", 0)
+            total_packets = tcp_packets + get("udp_packets", 0)
+            tcp_ratio = tcp_packets / total_packets if total_packets else 0.0
         
         # Network attack detection
-        threats.extend(self._detect_port_scan(data))
-        threats.extend(self._detect_ddos(data))
-        threats.extend(self._detect_data_exfiltration(data, tcp_ratio))
-        threats.extend(self._detect_syn_flood(data, tcp_ratio))
+        if (get("unique_ports", 0) > self._t_port_scan_ports
+                and pps > self._t_port_scan_pps):
+            threats.append(self._port_scan_threat)
+        if pps > self._t_ddos_pps and bps > self._t_ddos_bps:
+            threats.append(self._ddos_threat)
+        if bps > self._t_exfil_bps and tcp_ratio > self._t_exfil_tcp_ratio:
+            threats.append(self._data_exfiltration_threat)
+        if syn_packets > self._t_syn_packets and tcp_ratio > self._t_syn_tcp_ratio:
+            threats.append(self._syn_flood_threat)
         
         # QoS/Transport layer detection
-        threats.extend(self._detect_qos_anomalies(data))
+        avg_latency = get("avg_latency_ms", 0)
+        jitter = get("jitter_ms", 0)
+        packet_loss = get("packet_loss_rate", 0)
+        if (get("max_latency_ms", 0) > self._t_max_latency
+                and avg_latency > self._t_avg_latency):
+            threats.append(self._latency_anomaly_threat)
+        if jitter > self._t_jitter:
+            threats.append(self._jitter_anomaly_threat)
+        if packet_loss > self._t_packet_loss:
+            threats.append(self._packet_loss_threat)
         
-        return threats
-    
-    def get_supported_data_types(self) -> List[str]:
-        """Return supported data types."""
-        return ["network", "qos", "transport"]
-    
-    def _detect_port_scan(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect port scanning attempts."""
-        unique_ports = data.get("unique_ports", 0)
-        pps = data.get("packets_per_second", 0)
+        # Combined QoS degradation: at least two degraded factors
+        qos_factors = (
+            (avg_latency > self._t_qos_latency)
+            + (jitter > self._t_qos_jitter)
+            + (packet_loss > self._t_qos_packet_loss)
+        )
+        if qos_factors >= 2:
+            threats.append(self._qos_degradation_threat)
         
-        if (unique_ports > NETWORK_THRESHOLDS["port_scan"]["unique_ports"] and
-            pps > NETWORK_THRESHOLDS["port_scan"]["packets_per_second"]):
-            return [("port_scan", THREAT_CONFIDENCE_MAPPING["port_scan"])]
-        return []
+        return threats
     
-    def _detect_ddos(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect DDoS attacks."""
-        pps = data.get("packets_per_second", 0)
-        bps = data.get("bytes_per_second", 0)
+    def detect_batch(
+        self, records: List[Dict[str, float]]
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Apply the same rules as detect() to many records at once.
         
-        if (pps > NETWORK_THRESHOLDS["ddos"]["packets_per_second"] and
-            bps > NETWORK_THRESHOLDS["ddos"]["bytes_per_second"]):
-            return [("ddos", THREAT_CONFIDENCE_MAPPING["ddos"])]
-        return []
-    
-    def _detect_data_exfiltration(self, data: Dict[str, float], tcp_ratio: float) -> List[Tuple[str, float]]:
-        """Detect data exfiltration attempts."""
-        bps = data.get("bytes_per_second", 0)
+        Each feature becomes one column and every rule one boolean mask, so
+        thresholds are compared once per batch instead of once per record.
+        Threats come back per record in detect() order.
+        """
+        cols = to_columns(records, (
+            "tcp_packets", "udp_packets", "unique_ports", "packets_per_second",
+            "bytes_per_second", "syn_packets", "max_latency_ms", "avg_latency_ms",
+            "jitter_ms", "packet_loss_rate",
+        ))
+        total_packets = cols["tcp_packets"] + cols["udp_packets"]
+        tcp_ratio = np.divide(
+            cols["tcp_packets"], total_packets,
+            out=np.zeros(len(records)), where=total_packets != 0
+        )
+        pps = cols["packets_per_second"]
+        bps = cols["bytes_per_second"]
+        avg_latency = cols["avg_latency_ms"]
+        jitter = cols["jitter_ms"]
+        packet_loss = cols["packet_loss_rate"]
         
-        if (bps > NETWORK_THRESHOLDS["data_exfiltration"]["bytes_per_second"] and
-            tcp_ratio > NETWORK_THRESHOLDS["data_exfiltration"]["tcp_ratio"]):
-            return [("data_exfiltration", THREAT_CONFIDENCE_MAPPING["data_exfiltration"])]
-        return []
-    
-    def _detect_syn_flood(self, data: Dict[str, float], tcp_ratio: float) -> List[Tuple[str, float]]:
-        """Detect SYN flood attacks."""
-        syn_packets = data.get("syn_packets", 0)
+        qos_factors = (
+            (avg_latency > self._t_qos_latency).astype(np.int8)
+            + (jitter > self._t_qos_jitter)
+            + (packet_loss > self._t_qos_packet_loss)
+        )
         
-        if (syn_packets > NETWORK_THRESHOLDS["syn_flood"]["syn_packets"] and
-            tcp_ratio > NETWORK_THRESHOLDS["syn_flood"]["tcp_ratio"]):
-            return [("syn_flood", THREAT_CONFIDENCE_MAPPING["syn_flood"])]
-        return []
+        checks = [
+            ("port_scan",
+             (cols["unique_ports"] > self._t_port_scan_ports)
+             & (pps > self._t_port_scan_pps)),
+            ("ddos", (pps > self._t_ddos_pps) & (bps > self._t_ddos_bps)),
+            ("data_exfiltration",
+             (bps > self._t_exfil_bps) & (tcp_ratio > self._t_exfil_tcp_ratio)),
+            ("syn_flood",
+             (cols["syn_packets"] > self._t_syn_packets)
+             & (tcp_ratio > self._t_syn_tcp_ratio)),
+            ("latency_anomaly",
+             (cols["max_latency_ms"] > self._t_max_latency)
+             & (avg_latency > self._t_avg_latency)),
+            ("jitter_anomaly", jitter > self._t_jitter),
+            ("packet_loss", packet_loss > self._t_packet_loss),
+            ("qos_degradation", qos_factors >= 2),
+        ]
+        return collect_threats(
+            len(records),
+            (
+                (threat, mask, THREAT_CONFIDENCE_MAPPING[threat])
+                for threat, mask in checks
+            ),
+        )
     
-    def _detect_qos_anomalies(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect QoS and transport layer anomalies."""
-        threats = []
-        
-        # Latency anomalies
-        max_latency = data.get("max_latency_ms", 0)
-        avg_latency = data.get("avg_latency_ms", 0)
-        if (max_latency > QOS_THRESHOLDS["latency_anomaly"]["max_latency_ms"] and
-            avg_latency > QOS_THRESHOLDS["latency_anomaly"]["avg_latency_ms"]):
-            threats.append(("latency_anomaly", THREAT_CONFIDENCE_MAPPING["latency_anomaly"]))
-        
-        # Jitter anomalies
-        jitter = data.get("jitter_ms", 0)
-        if jitter > QOS_THRESHOLDS["jitter_anomaly"]["jitter_ms"]:
-            threats.append(("jitter_anomaly", THREAT_CONFIDENCE_MAPPING["jitter_anomaly"]))
-        
-        # Packet loss
-        packet_loss = data.get("packet_loss_rate", 0)
-        if packet_loss > QOS_THRESHOLDS["packet_loss"]["packet_loss_rate"]:
-            threats.append(("packet_loss", THREAT_CONFIDENCE_MAPPING["packet_loss"]))
-        
-        # Combined QoS degradation
-        qos_factors = 0
-        if avg_latency > QOS_THRESHOLDS["qos_degradation"]["avg_latency_ms"]:
-            qos_factors += 1
-        if jitter > QOS_THRESHOLDS["qos_degradation"]["jitter_ms"]:
-            qos_factors += 1
-        if packet_loss > QOS_THRESHOLDS["qos_degradation"]["packet_loss_rate"]:
-            qos_factors += 1
-        
-        if qos_factors >= 2:
-            threats.append(("qos_degradation", THREAT_CONFIDENCE_MAPPING["qos_degradation"]))
-        
-        return threats
\ No newline at end of file
+    def get_supported_data_types(self) -> List[str]:
+        """Return supported data types."""
+        return ["network", "qos", "transport"]
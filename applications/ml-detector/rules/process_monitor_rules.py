@@ -5,12 +5,31 @@ This module contains detection logic for suspicious processes,
 malware behavior, and anomalous system activities.
 """
 import logging
+import re
 from typing import Dict, List, Tuple
 
+import numpy as np
+
 from models.base import BaseRuleEngine
 
+from .vectorized import collect_threats, to_columns
+
 logger = logging.getLogger(__name__)
 
+# Processes expected to move a lot of network traffic
+EXPECTED_NETWORK_PROCESSES = ('chrome', 'firefox', 'curl', 'wget', 'ssh', 'scp')
+
+# Command-line fragments that raise suspicious_command_execution to 0.95
+HIGH_RISK_COMMAND_PATTERNS = ('reverse shell', 'nc -l', '/etc/passwd')
+
+# Name fragments of legitimate children of system processes
+LEGITIMATE_SYSTEM_CHILDREN = ('system', 'service', 'daemon')
+
+
+def _alternation(substrings) -> "re.Pattern[str]":
+    """Compile literal substrings into one pattern; search() == any(s in text)."""
+    return re.compile("|".join(map(re.escape, substrings)))
+
 
 class ProcessMonitorRuleEngine(BaseRuleEngine):
     """Rule-based detection for suspicious process behavior."""
@@ -42,20 +61,45 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
             }
         }
         
+        # Flattened copies of the nested thresholds for the per-tick path
+        abuse = self.thresholds["resource_abuse"]
+        malware = self.thresholds["malware_behavior"]
+        escalation = self.thresholds["privilege_escalation"]
+        persistence = self.thresholds["persistence_mechanism"]
+        self._t_max_cpu = abuse["max_cpu_percent"]
+        self._t_max_memory_mb = abuse["max_memory_mb"]
+        self._t_max_connections = abuse["max_network_connections"]
+        self._t_max_files = abuse["max_files_opened"]
+        self._t_max_children = malware["max_child_processes"]
+        self._t_max_syscalls = malware["max_syscalls_per_second"]
+        self._t_network_mb = malware["network_threshold_mb"]
+        self._t_unprivileged_cpu = escalation["unprivileged_high_cpu"]
+        self._t_privileged_network_mb = escalation["privileged_network_mb"]
+        self._t_privileged_files = escalation["privileged_file_access"]
+        self._t_long_execution_hours = persistence["long_execution_hours"]
+        self._t_background_network_mb = persistence["background_network_mb"]
+        self._t_background_syscalls = persistence["background_syscalls"]
+        
         # Known suspicious process patterns
-        self.suspicious_process_names = [
+        self.suspicious_process_names = frozenset([
             'nc', 'netcat', 'socat', 'telnet', 'nmap', 'masscan',
             'metasploit', 'msfconsole', 'msfvenom', 
             'python -c', 'perl -e', 'ruby -e', 'node -e',
             'base64', 'xxd', 'hexdump', 'strings',
             'wget', 'curl', 'aria2c', 'axel'
-        ]
+        ])
         
         # Suspicious parent processes (process injection indicators)
         self.suspicious_parents = [
             'explorer.exe', 'winlogon.exe', 'csrss.exe',
             'svchost.exe', 'lsass.exe', 'systemd'
         ]
+        
+        # Each substring list as one alternation, searched in a single pass
+        self._expected_net_re = _alternation(EXPECTED_NETWORK_PROCESSES)
+        self._high_risk_cmd_re = _alternation(HIGH_RISK_COMMAND_PATTERNS)
+        self._susp_parent_re = _alternation(self.suspicious_parents)
+        self._legit_child_re = _alternation(LEGITIMATE_SYSTEM_CHILDREN)
     
     def detect(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
         """Apply process monitoring rules and return detected threats."""
@@ -78,6 +122,104 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         
         return threats
     
+    def detect_batch(
+        self, records: List[Dict[str, float]]
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Apply the same rules as detect() to many records at once.
+        
+        Numeric thresholds and confidences are evaluated as column masks;
+        the string checks run per record, and only where a numeric mask
+        needs them. Threats come back per record in detect() order.
+        """
+        n = len(records)
+        cols = to_columns(records, (
+            "cpu_usage_percent", "memory_usage_mb", "network_connections",
+            "files_opened", "child_processes", "syscalls_per_second",
+            "network_bytes_sent", "network_bytes_received", "execution_time_seconds",
+            "is_privileged", "is_suspicious_name", "is_suspicious_command",
+        ))
+        process_names = [data.get("process_name", "").lower() for data in records]
+        susp_parent = self._susp_parent_re.search
+        legit_child = self._legit_child_re.search
+        injection = np.fromiter(
+            (susp_parent(data.get("parent_process", "").lower()) is not None
+             and legit_child(name) is None
+             for data, name in zip(records, process_names, strict=True)),
+            dtype=bool, count=n
+        )
+        
+        cpu = cols["cpu_usage_percent"]
+        memory_mb = cols["memory_usage_mb"]
+        connections = cols["network_connections"]
+        files_opened = cols["files_opened"]
+        child_processes = cols["child_processes"]
+        syscalls = cols["syscalls_per_second"]
+        sent = cols["network_bytes_sent"]
+        received = cols["network_bytes_received"]
+        # Same arithmetic as the scalar helpers so confidences match exactly
+        total_network = sent / 1024 / 1024 + received / 1024 / 1024
+        network_mb = (sent + received) / 1024 / 1024
+        privileged = cols["is_privileged"] != 0
+        suspicious_name = cols["is_suspicious_name"] != 0
+        suspicious_command = cols["is_suspicious_command"] != 0
+        
+        # String checks only for the records whose numeric mask already fired
+        heavy_network = total_network > self._t_network_mb
+        for i in np.flatnonzero(heavy_network).tolist():
+            if self._expected_net_re.search(process_names[i]):
+                heavy_network[i] = False
+        command_confidence = np.full(n, 0.85)
+        for i in np.flatnonzero(suspicious_command).tolist():
+            command_line = records[i].get("command_line", "").lower()
+            if self._high_risk_cmd_re.search(command_line):
+                command_confidence[i] = 0.95
+        
+        risk_factors = (
+            (network_mb > self._t_background_network_mb).astype(np.int8)
+            + (syscalls > self._t_background_syscalls)
+            + suspicious_name
+        )
+        
+        checks = [
+            # Resource abuse
+            ("cpu_resource_abuse", cpu > self._t_max_cpu,
+             np.minimum(0.9, 0.6 + cpu / 100)),
+            ("memory_resource_abuse", memory_mb > self._t_max_memory_mb,
+             np.minimum(0.85, 0.5 + memory_mb / 8192)),
+            ("network_connection_abuse", connections > self._t_max_connections,
+             np.minimum(0.9, 0.7 + connections / 500)),
+            ("file_handle_abuse", files_opened > self._t_max_files,
+             np.minimum(0.8, 0.6 + files_opened / 1000)),
+            # Malware behavior
+            ("process_spawning_anomaly", child_processes > self._t_max_children,
+             np.minimum(0.95, 0.8 + child_processes / 50)),
+            ("high_syscall_activity", syscalls > self._t_max_syscalls,
+             np.minimum(0.9, 0.7 + syscalls / 5000)),
+            ("unexpected_network_activity", heavy_network,
+             np.minimum(0.85, 0.6 + total_network / 500)),
+            # Privilege escalation
+            ("unprivileged_high_cpu", ~privileged & (cpu > self._t_unprivileged_cpu),
+             0.75 + np.minimum(0.2, (cpu - 80) / 100)),
+            ("privileged_network_activity",
+             privileged & (network_mb > self._t_privileged_network_mb),
+             0.8 + np.minimum(0.15, network_mb / 200)),
+            ("privileged_file_harvesting",
+             privileged & (files_opened > self._t_privileged_files),
+             0.7 + np.minimum(0.25, files_opened / 1000)),
+            # Persistence
+            ("persistence_mechanism",
+             (cols["execution_time_seconds"] / 3600 > self._t_long_execution_hours)
+             & (risk_factors >= 2),
+             np.minimum(0.7 + risk_factors * 0.1, 0.95)),
+            # Suspicious names, command lines and parents
+            ("suspicious_process_name", suspicious_name,
+             np.minimum(0.8 + privileged * 0.1 + (connections > 5) * 0.05, 0.95)),
+            ("suspicious_command_execution", suspicious_command, command_confidence),
+            ("process_injection_indicator", injection, 0.8),
+        ]
+        return collect_threats(n, checks)
+    
     def get_supported_data_types(self) -> List[str]:
         """Return supported data types."""
         return ["process_monitor", "system_behavior", "malware"]
@@ -88,25 +230,25 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         
         # CPU abuse
         cpu_usage = data.get("cpu_usage_percent", 0)
-        if cpu_usage > self.thresholds["resource_abuse"]["max_cpu_percent"]:
+        if cpu_usage > self._t_max_cpu:
             confidence = min(0.9, 0.6 + (cpu_usage / 100))
             threats.append(("cpu_resource_abuse", confidence))
         
         # Memory abuse
         memory_mb = data.get("memory_usage_mb", 0)
-        if memory_mb > self.thresholds["resource_abuse"]["max_memory_mb"]:
+        if memory_mb > self._t_max_memory_mb:
             confidence = min(0.85, 0.5 + (memory_mb / 8192))
             threats.append(("memory_resource_abuse", confidence))
         
         # Network connection abuse
         connections = data.get("network_connections", 0)
-        if connections > self.thresholds["resource_abuse"]["max_network_connections"]:
+        if connections > self._t_max_connections:
             confidence = min(0.9, 0.7 + (connections / 500))
             threats.append(("network_connection_abuse", confidence))
         
         # File handle abuse
         files_opened = data.get("files_opened", 0)
-        if files_opened > self.thresholds["resource_abuse"]["max_files_opened"]:
+        if files_opened > self._t_max_files:
             confidence = min(0.8, 0.6 + (files_opened / 1000))
             threats.append(("file_handle_abuse", confidence))
         
@@ -118,13 +260,13 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         
         # Process spawning behavior
         child_processes = data.get("child_processes", 0)
-        if child_processes > self.thresholds["malware_behavior"]["max_child_processes"]:
+        if child_processes > self._t_max_children:
             confidence = min(0.95, 0.8 + (child_processes / 50))
             threats.append(("process_spawning_anomaly", confidence))
         
         # High syscall rate (injection, hooking)
         syscalls = data.get("syscalls_per_second", 0)
-        if syscalls > self.thresholds["malware_behavior"]["max_syscalls_per_second"]:
+        if syscalls > self._t_max_syscalls:
             confidence = min(0.9, 0.7 + (syscalls / 5000))
             threats.append(("high_syscall_activity", confidence))
         
@@ -133,12 +275,10 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         network_recv = data.get("network_bytes_received", 0) / 1024 / 1024  # MB
         total_network = network_sent + network_recv
         
-        if total_network > self.thresholds["malware_behavior"]["network_threshold_mb"]:
+        if total_network > self._t_network_mb:
             # Check if this is expected to have network activity
             process_name = data.get("process_name", "").lower()
-            expected_network_processes = ['chrome', 'firefox', 'curl', 'wget', 'ssh', 'scp']
-            
-            if not any(proc in process_name for proc in expected_network_processes):
+            if not self._expected_net_re.search(process_name):
                 confidence = min(0.85, 0.6 + (total_network / 500))
                 threats.append(("unexpected_network_activity", confidence))
         
@@ -154,17 +294,17 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         files_opened = data.get("files_opened", 0)
         
         # Unprivileged process with high CPU (possible exploit)
-        if not is_privileged and cpu_usage > self.thresholds["privilege_escalation"]["unprivileged_high_cpu"]:
+        if not is_privileged and cpu_usage > self._t_unprivileged_cpu:
             confidence = 0.75 + min(0.2, (cpu_usage - 80) / 100)
             threats.append(("unprivileged_high_cpu", confidence))
         
         # Privileged process with unexpected network activity
-        if is_privileged and network_mb > self.thresholds["privilege_escalation"]["privileged_network_mb"]:
+        if is_privileged and network_mb > self._t_privileged_network_mb:
             confidence = 0.8 + min(0.15, network_mb / 200)
             threats.append(("privileged_network_activity", confidence))
         
         # Privileged process accessing many files (data harvesting)
-        if is_privileged and files_opened > self.thresholds["privilege_escalation"]["privileged_file_access"]:
+        if is_privileged and files_opened > self._t_privileged_files:
             confidence = 0.7 + min(0.25, files_opened / 1000)
             threats.append(("privileged_file_harvesting", confidence))
         
@@ -179,15 +319,15 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
         network_mb = (data.get("network_bytes_sent", 0) + data.get("network_bytes_received", 0)) / 1024 / 1024
         syscalls = data.get("syscalls_per_second", 0)
         
-        if execution_hours > self.thresholds["persistence_mechanism"]["long_execution_hours"]:
+        if execution_hours > self._t_long_execution_hours:
             risk_factors = 0
             
             # Background network activity
-            if network_mb > self.thresholds["persistence_mechanism"]["background_network_mb"]:
+            if network_mb > self._t_background_network_mb:
                 risk_factors += 1
             
             # Background syscall activity
-            if syscalls > self.thresholds["persistence_mechanism"]["background_syscalls"]:
+            if syscalls > self._t_background_syscalls:
                 risk_factors += 1
             
             # Suspicious process name
@@ -220,17 +360,17 @@ class ProcessMonitorRuleEngine(BaseRuleEngine):
             confidence = 0.85
             # Command injection or shell commands are highly suspicious
             command_line = data.get("command_line", "").lower()
-            if any(pattern in command_line for pattern in ['reverse shell', 'nc -l', '/etc/passwd']):
+            if self._high_risk_cmd_re.search(command_line):
                 confidence = 0.95
             
             threats.append(("suspicious_command_execution", confidence))
         
         # Process injection indicators (suspicious parent)
         parent = data.get("parent_process", "").lower()
-        if any(susp_parent in parent for susp_parent in self.suspicious_parents):
+        if self._susp_parent_re.search(parent):
             process_name = data.get("process_name", "")
             # Legitimate child processes of system processes
-            if not any(legit in process_name.lower() for legit in ['system', 'service', 'daemon']):
+            if not self._legit_child_re.search(process_name.lower()):
                 threats.append(("process_injection_indicator", 0.8))
         
         return threats
\ No newline at end of file
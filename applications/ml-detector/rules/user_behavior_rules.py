@@ -5,182 +5,319 @@ This module contains detection logic for suspicious user activities,
 insider threats, and anomalous user sessions.
 """
 import logging
+import os
+import re
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Dict, List, Tuple
 from datetime import datetime
 
+import numpy as np
+
 from models.base import BaseRuleEngine
+from .vectorized import collect_threats, to_columns
 
 logger = logging.getLogger(__name__)
 
 
+def _file_paths(files_accessed) -> Tuple[str, ...]:
+    """
+    Normalize an untrusted files_accessed value to a tuple of paths. A bare
+    string or a non-iterable reads as no files; any other iterable
+    (generators included) is consumed exactly once.
+    """
+    if not files_accessed or isinstance(files_accessed, str):
+        return ()
+    if type(files_accessed) is tuple:
+        return files_accessed
+    try:
+        return tuple(files_accessed)
+    except TypeError:
+        return ()
+
+
+# Source of the generated detect(): every rule inline, thresholds folded in
+# as literals by UserBehaviorRuleEngine._compile_detect(). Events that pass
+# the benign gate are scored by score(), which can be memoized on the feature
+# values so replayed or retried events skip rule evaluation.
+_DETECT_TEMPLATE = """
+def detect(data):
+    get = data.get
+    session_hours = get("session_duration", 0) / 3600
+    commands = get("commands_executed", 0)
+    login_hour = get("login_time_hour", 12)
+    escalations = get("privilege_escalations", 0)
+    sudo_commands = get("sudo_commands", 0)
+    files_accessed = file_paths(get("files_accessed"))
+    download_mb = get("data_downloaded_mb", 0)
+    upload_mb = get("data_uploaded_mb", 0)
+    failed_attempts = get("failed_auth_attempts", 0)
+    
+    # Benign fast path: daytime, no files, every feature at or under the
+    # lowest threshold that could use it, so no rule below can fire
+    if (not files_accessed and {night_end!r} < login_hour < {night_start!r}
+            and commands <= {benign_commands!r}
+            and session_hours <= {max_session_hours!r}
+            and escalations <= {max_escalations!r} and sudo_commands <= {max_sudo!r}
+            and download_mb <= {max_download_mb!r} and upload_mb <= {max_upload_mb!r}
+            and failed_attempts <= {failed_auth!r}):
+        return []
+    
+    return {copy}(score(
+        session_hours, commands, login_hour, escalations, sudo_commands,
+        files_accessed, download_mb, upload_mb, failed_attempts,
+        get("login_source") == "remote",
+    ))
+
+{score_decorator}
+def score(session_hours, commands, login_hour, escalations, sudo_commands,
+          files_accessed, download_mb, upload_mb, failed_attempts, remote):
+    threats = []
+    append = threats.append
+    
+    # Session anomalies
+    if session_hours > {max_session_hours!r}:
+        append(("long_session_anomaly", min(0.9, 0.5 + (session_hours / 24))))
+    if commands > {max_commands!r}:
+        append(("excessive_commands", min(0.95, 0.6 + (commands / 2000))))
+    is_night = login_hour >= {night_start!r} or login_hour <= {night_end!r}
+    if is_night:
+        # Higher suspicion for night logins with activity
+        confidence = 0.6
+        if commands > 10:
+            confidence += 0.2
+        if escalations > 0:
+            confidence += 0.1
+        append(("off_hours_activity", min(confidence, 0.95)))
+    
+    # Privilege abuse
+    if escalations > {max_escalations!r}:
+        append(("privilege_escalation_abuse", min(0.9, 0.7 + (escalations / 20))))
+    if sudo_commands > {max_sudo!r}:
+        append(("excessive_sudo_usage", min(0.85, 0.6 + (sudo_commands / 50))))
+    sensitive_count = count_sensitive_files(files_accessed)
+    if sensitive_count:
+        append(("sensitive_file_access", min(0.95, 0.8 + sensitive_count * 0.05)))
+    
+    # Data exfiltration by users
+    if download_mb > {max_download_mb!r}:
+        append(("user_large_download", min(0.9, 0.6 + (download_mb / 5000))))
+    if upload_mb > {max_upload_mb!r}:
+        append(("user_data_exfiltration", min(0.95, 0.7 + (upload_mb / 2000))))
+    files_count = len(files_accessed)
+    if files_count > {max_files!r}:
+        append(("excessive_file_access", min(0.8, 0.5 + (files_count / 500))))
+    
+    # Insider threat patterns
+    if remote and commands > {remote_commands!r}:
+        append(("insider_remote_activity", 0.75 + min(0.2, commands / 1000)))
+    if failed_attempts > {failed_auth!r}:
+        append(("insider_auth_probing", min(0.85, 0.6 + (failed_attempts / 50))))
+    if {insider_night} and commands > {off_hours_commands!r}:
+        # Multiple risk factors increase confidence
+        risk_factors = (escalations > 0) + (upload_mb > 10) + remote
+        append(("insider_off_hours_activity", 0.65 + (risk_factors * 0.1)))
+    
+    return threats
+"""
+
+
 class UserBehaviorRuleEngine(BaseRuleEngine):
     """Rule-based detection for suspicious user behavior."""
     
+    # Thresholds for user behavior anomalies; read-only and shared by every
+    # instance, as are the flattened values and the generated detect()
+    thresholds = MappingProxyType({
+        "session_anomaly": MappingProxyType({
+            "max_session_hours": 12,
+            "max_commands": 1000,
+            "night_login_start": 23,  # 11 PM
+            "night_login_end": 6      # 6 AM
+        }),
+        "privilege_abuse": MappingProxyType({
+            "max_privilege_escalations": 5,
+            "max_sudo_commands": 20,
+            "suspicious_file_access": ("passwd", "shadow", "sudoers")
+        }),
+        "data_exfiltration_user": MappingProxyType({
+            "max_download_mb": 1000,    # 1GB download suspicious
+            "max_upload_mb": 500,       # 500MB upload suspicious
+            "max_files_accessed": 100
+        }),
+        "insider_threat": MappingProxyType({
+            "off_hours_commands": 50,
+            "remote_login_commands": 200,
+            "failed_auth_threshold": 10
+        })
+    })
+    
+    # Flattened copies of the nested thresholds for the per-event path
+    _t_max_session_hours = thresholds["session_anomaly"]["max_session_hours"]
+    _t_max_commands = thresholds["session_anomaly"]["max_commands"]
+    _t_night_start = thresholds["session_anomaly"]["night_login_start"]
+    _t_night_end = thresholds["session_anomaly"]["night_login_end"]
+    _t_max_escalations = thresholds["privilege_abuse"]["max_privilege_escalations"]
+    _t_max_sudo = thresholds["privilege_abuse"]["max_sudo_commands"]
+    _suspicious_file_re = re.compile("|".join(
+        map(re.escape, thresholds["privilege_abuse"]["suspicious_file_access"])
+    ))
+    _t_max_download_mb = thresholds["data_exfiltration_user"]["max_download_mb"]
+    _t_max_upload_mb = thresholds["data_exfiltration_user"]["max_upload_mb"]
+    _t_max_files = thresholds["data_exfiltration_user"]["max_files_accessed"]
+    _t_off_hours_commands = thresholds["insider_threat"]["off_hours_commands"]
+    _t_remote_commands = thresholds["insider_threat"]["remote_login_commands"]
+    _t_failed_auth = thresholds["insider_threat"]["failed_auth_threshold"]
+    
+    # Distinct flagged events remembered by the generated detect(); 0 disables
+    detect_cache_size = int(os.getenv("USER_RULES_CACHE_SIZE", "0"))
+    
     def __init__(self):
-        # Thresholds for user behavior anomalies
-        self.thresholds = {
-            "session_anomaly": {
-                "max_session_hours": 12,
-                "max_commands": 1000,
-                "night_login_start": 23,  # 11 PM
-                "night_login_end": 6      # 6 AM
-            },
-            "privilege_abuse": {
-                "max_privilege_escalations": 5,
-                "max_sudo_commands": 20,
-                "suspicious_file_access": ["passwd", "shadow", "sudoers"]
-            },
-            "data_exfiltration_user": {
-                "max_download_mb": 1000,    # 1GB download suspicious
-                "max_upload_mb": 500,       # 500MB upload suspicious
-                "max_files_accessed": 100
-            },
-            "insider_threat": {
-                "off_hours_commands": 50,
-                "remote_login_commands": 200,
-                "failed_auth_threshold": 10
-            }
-        }
+        # Generate detect() once per class rather than once per instance
+        cls = type(self)
+        if "_compiled_detect" not in cls.__dict__:
+            cls._compiled_detect = staticmethod(cls._compile_detect())
     
     def detect(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
         """Apply user behavior rules and return detected threats."""
-        threats: List[Tuple[str, float]] = []
-        
-        # Session anomalies
-        threats.extend(self._detect_session_anomalies(data))
-        
-        # Privilege abuse
-        threats.extend(self._detect_privilege_abuse(data))
-        
-        # Data exfiltration by users
-        threats.extend(self._detect_user_data_exfiltration(data))
-        
-        # Insider threat patterns
-        threats.extend(self._detect_insider_threat(data))
-        
-        return threats
+        return self._compiled_detect(data)
     
-    def get_supported_data_types(self) -> List[str]:
-        """Return supported data types."""
-        return ["user_behavior", "authentication", "session"]
+    @classmethod
+    def _compile_detect(cls):
+        """
+        Build detect() as generated code with the class's thresholds
+        folded in as constants: a benign gate, then a single score() call
+        that runs the rules straight through without per-helper lists.
+        score() is wrapped in an LRU cache when detect_cache_size > 0.
+        """
+        cached = cls.detect_cache_size > 0
+        source = _DETECT_TEMPLATE.format(
+            max_session_hours=cls._t_max_session_hours,
+            max_commands=cls._t_max_commands,
+            night_start=cls._t_night_start,
+            night_end=cls._t_night_end,
+            max_escalations=cls._t_max_escalations,
+            max_sudo=cls._t_max_sudo,
+            max_download_mb=cls._t_max_download_mb,
+            max_upload_mb=cls._t_max_upload_mb,
+            max_files=cls._t_max_files,
+            remote_commands=cls._t_remote_commands,
+            failed_auth=cls._t_failed_auth,
+            off_hours_commands=cls._t_off_hours_commands,
+            insider_night=cls._insider_night_expression(),
+            benign_commands=min(
+                cls._t_max_commands, cls._t_remote_commands, cls._t_off_hours_commands
+            ),
+            # Memoized results are copied out so callers never share a cached list
+            score_decorator=(
+                f"@lru_cache(maxsize={cls.detect_cache_size})" if cached else ""
+            ),
+            copy="list" if cached else "",
+        )
+        namespace = {
+            "file_paths": _file_paths,
+            "count_sensitive_files": cls._count_sensitive_files,
+            "lru_cache": lru_cache,
+        }
+        exec(compile(source, "<UserBehaviorRuleEngine.detect>", "exec"), namespace)
+        return namespace["detect"]
     
-    def _detect_session_anomalies(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect anomalous user sessions."""
-        threats = []
-        
-        # Long session duration
-        session_hours = data.get("session_duration", 0) / 3600
-        if session_hours > self.thresholds["session_anomaly"]["max_session_hours"]:
-            confidence = min(0.9, 0.5 + (session_hours / 24))
-            threats.append(("long_session_anomaly", confidence))
+    def detect_batch(
+        self, records: List[Dict[str, float]]
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Apply the same rules as detect() to many records at once.
         
-        # Excessive commands
-        commands = data.get("commands_executed", 0)
-        if commands > self.thresholds["session_anomaly"]["max_commands"]:
-            confidence = min(0.95, 0.6 + (commands / 2000))
-            threats.append(("excessive_commands", confidence))
+        Numeric thresholds and confidences are evaluated as column masks;
+        only the file list and login source are inspected per record.
+        Threats come back per record in detect() order.
+        """
+        n = len(records)
+        cols = to_columns(records, (
+            "session_duration", "commands_executed", "privilege_escalations",
+            "sudo_commands", "data_downloaded_mb", "data_uploaded_mb",
+            "failed_auth_attempts",
+        ))
+        login_hour = np.fromiter(
+            (data.get("login_time_hour", 12) for data in records),
+            dtype=np.float64, count=n
+        )
+        remote = np.fromiter(
+            (data.get("login_source") == "remote" for data in records),
+            dtype=bool, count=n
+        )
+        files = [_file_paths(data.get("files_accessed")) for data in records]
+        files_count = np.fromiter((len(f) for f in files), dtype=np.float64, count=n)
+        sensitive_count = np.fromiter(
+            (self._count_sensitive_files(f) for f in files),
+            dtype=np.float64, count=n
+        )
         
-        # Off-hours login
-        login_hour = data.get("login_time_hour", 12)
-        night_start = self.thresholds["session_anomaly"]["night_login_start"]
-        night_end = self.thresholds["session_anomaly"]["night_login_end"]
+        session_hours = cols["session_duration"] / 3600
+        commands = cols["commands_executed"]
+        escalations = cols["privilege_escalations"]
+        sudo_commands = cols["sudo_commands"]
+        download_mb = cols["data_downloaded_mb"]
+        upload_mb = cols["data_uploaded_mb"]
+        failed_attempts = cols["failed_auth_attempts"]
+        escalated = escalations > 0
         
-        if login_hour >= night_start or login_hour <= night_end:
-            # Higher suspicion for night logins with activity
-            base_confidence = 0.6
-            if commands > 10:
-                base_confidence += 0.2
-            if data.get("privilege_escalations", 0) > 0:
-                base_confidence += 0.1
-            threats.append(("off_hours_activity", min(base_confidence, 0.95)))
+        night_login = (
+            (login_hour >= self._t_night_start) | (login_hour <= self._t_night_end)
+        )
+        risk_factors = escalated.astype(np.int8) + (upload_mb > 10) + remote
         
-        return threats
+        checks = [
+            # Session anomalies
+            ("long_session_anomaly", session_hours > self._t_max_session_hours,
+             np.minimum(0.9, 0.5 + session_hours / 24)),
+            ("excessive_commands", commands > self._t_max_commands,
+             np.minimum(0.95, 0.6 + commands / 2000)),
+            ("off_hours_activity", night_login,
+             np.minimum(0.6 + (commands > 10) * 0.2 + escalated * 0.1, 0.95)),
+            # Privilege abuse
+            ("privilege_escalation_abuse", escalations > self._t_max_escalations,
+             np.minimum(0.9, 0.7 + escalations / 20)),
+            ("excessive_sudo_usage", sudo_commands > self._t_max_sudo,
+             np.minimum(0.85, 0.6 + sudo_commands / 50)),
+            ("sensitive_file_access", sensitive_count > 0,
+             np.minimum(0.95, 0.8 + sensitive_count * 0.05)),
+            # Data exfiltration by users
+            ("user_large_download", download_mb > self._t_max_download_mb,
+             np.minimum(0.9, 0.6 + download_mb / 5000)),
+            ("user_data_exfiltration", upload_mb > self._t_max_upload_mb,
+             np.minimum(0.95, 0.7 + upload_mb / 2000)),
+            ("excessive_file_access", files_count > self._t_max_files,
+             np.minimum(0.8, 0.5 + files_count / 500)),
+            # Insider threat patterns
+            ("insider_remote_activity", remote & (commands > self._t_remote_commands),
+             0.75 + np.minimum(0.2, commands / 1000)),
+            ("insider_auth_probing", failed_attempts > self._t_failed_auth,
+             np.minimum(0.85, 0.6 + failed_attempts / 50)),
+            ("insider_off_hours_activity",
+             ((login_hour >= 23) | (login_hour <= 6))
+             & (commands > self._t_off_hours_commands),
+             0.65 + risk_factors * 0.1),
+        ]
+        return collect_threats(n, checks)
     
-    def _detect_privilege_abuse(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect privilege escalation and abuse."""
-        threats = []
-        
-        # Multiple privilege escalations
-        escalations = data.get("privilege_escalations", 0)
-        if escalations > self.thresholds["privilege_abuse"]["max_privilege_escalations"]:
-            confidence = min(0.9, 0.7 + (escalations / 20))
-            threats.append(("privilege_escalation_abuse", confidence))
-        
-        # Excessive sudo usage
-        sudo_commands = data.get("sudo_commands", 0)
-        if sudo_commands > self.thresholds["privilege_abuse"]["max_sudo_commands"]:
-            confidence = min(0.85, 0.6 + (sudo_commands / 50))
-            threats.append(("excessive_sudo_usage", confidence))
-        
-        # Sensitive file access
-        files_accessed = data.get("files_accessed", [])
-        if isinstance(files_accessed, list):
-            sensitive_files = [
-                f for f in files_accessed 
-                if any(pattern in f.lower() for pattern in self.thresholds["privilege_abuse"]["suspicious_file_access"])
-            ]
-            if sensitive_files:
-                confidence = min(0.95, 0.8 + len(sensitive_files) * 0.05)
-                threats.append(("sensitive_file_access", confidence))
-        
-        return threats
+    @classmethod
+    def _insider_night_expression(cls) -> str:
+        """
+        Source for the insider rule's fixed 23:00-06:00 window. With the
+        default night thresholds it is the same predicate as off-hours
+        login, so the generated code reuses that result.
+        """
+        if (cls._t_night_start, cls._t_night_end) == (23, 6):
+            return "is_night"
+        return "(login_hour >= 23 or login_hour <= 6)"
     
-    def _detect_user_data_exfiltration(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect data exfiltration by users."""
-        threats = []
-        
-        # Large downloads
-        download_mb = data.get("data_downloaded_mb", 0)
-        if download_mb > self.thresholds["data_exfiltration_user"]["max_download_mb"]:
-            confidence = min(0.9, 0.6 + (download_mb / 5000))
-            threats.append(("user_large_download", confidence))
-        
-        # Large uploads (data exfiltration)
-        upload_mb = data.get("data_uploaded_mb", 0)
-        if upload_mb > self.thresholds["data_exfiltration_user"]["max_upload_mb"]:
-            confidence = min(0.95, 0.7 + (upload_mb / 2000))
-            threats.append(("user_data_exfiltration", confidence))
-        
-        # Excessive file access
-        files_count = len(data.get("files_accessed", []))
-        if files_count > self.thresholds["data_exfiltration_user"]["max_files_accessed"]:
-            confidence = min(0.8, 0.5 + (files_count / 500))
-            threats.append(("excessive_file_access", confidence))
-        
-        return threats
+    def get_supported_data_types(self) -> List[str]:
+        """Return supported data types."""
+        return ["user_behavior", "authentication", "session"]
     
-    def _detect_insider_threat(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
-        """Detect insider threat patterns."""
-        threats = []
-        
-        # Remote login with high activity
-        if data.get("login_source") == "remote":
-            commands = data.get("commands_executed", 0)
-            if commands > self.thresholds["insider_threat"]["remote_login_commands"]:
-                confidence = 0.75 + min(0.2, commands / 1000)
-                threats.append(("insider_remote_activity", confidence))
-        
-        # Failed authentication attempts (reconnaissance)
-        failed_attempts = data.get("failed_auth_attempts", 0)
-        if failed_attempts > self.thresholds["insider_threat"]["failed_auth_threshold"]:
-            confidence = min(0.85, 0.6 + (failed_attempts / 50))
-            threats.append(("insider_auth_probing", confidence))
-        
-        # Off-hours activity combined with other factors
-        login_hour = data.get("login_time_hour", 12)
-        commands = data.get("commands_executed", 0)
-        
-        if (login_hour >= 23 or login_hour <= 6) and commands > self.thresholds["insider_threat"]["off_hours_commands"]:
-            # Multiple risk factors increase confidence
-            risk_factors = 0
-            if data.get("privilege_escalations", 0) > 0:
-                risk_factors += 1
-            if data.get("data_uploaded_mb", 0) > 10:
-                risk_factors += 1
-            if data.get("login_source") == "remote":
-                risk_factors += 1
-            
-            confidence = 0.65 + (risk_factors * 0.1)
-            threats.append(("insider_off_hours_activity", confidence))
-        
-        return threats
\ No newline at end of file
+    @classmethod
+    def _count_sensitive_files(cls, files_accessed: Tuple[str, ...]) -> int:
+        """Number of accessed paths matching a suspicious file pattern."""
+        # One lowercase and one scan per path, whatever the pattern count
+        search = cls._suspicious_file_re.search
+        return sum(1 for f in files_accessed if search(f.lower()))
@@ -0,0 +1,44 @@
+"""
+Helpers for evaluating rule engines over many records at once.
+
+Rules are expressed as boolean masks over per-feature columns
+(struct-of-arrays) and collected back into the per-record
+``[(threat_type, confidence), ...]`` lists that ``detect()`` returns.
+"""
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def to_columns(
+    records: Sequence[Dict[str, float]], keys: Iterable[str]
+) -> Dict[str, np.ndarray]:
+    """Build one float64 column per key; missing or None values read as 0."""
+    n = len(records)
+    return {
+        key: np.fromiter((r.get(key) or 0 for r in records), dtype=np.float64, count=n)
+        for key in keys
+    }
+
+
+def collect_threats(
+    n: int, checks: Iterable[Tuple[str, np.ndarray, Union[float, np.ndarray]]]
+) -> List[List[Tuple[str, float]]]:
+    """
+    Turn ordered ``(threat_type, mask, confidence)`` checks into per-record
+    threat lists. ``confidence`` is a scalar or a per-record array; checks
+    are appended in the order given, matching the scalar ``detect()``.
+    """
+    results: List[List[Tuple[str, float]]] = [[] for _ in range(n)]
+    for threat_type, mask, confidence in checks:
+        idx = np.flatnonzero(mask)
+        if not idx.size:
+            continue
+        if np.ndim(confidence) == 0:
+            threat = (threat_type, float(confidence))
+            for i in idx.tolist():
+                results[i].append(threat)
+        else:
+            for i, c in zip(idx.tolist(), confidence[idx].tolist(), strict=True):
+                results[i].append((threat_type, c))
+    return results
@@ -1,36 +1,87 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, confloat, conint
-from typing import List, Optional
+import re
+from typing import Annotated, ClassVar, List, Optional
 
+import msgspec
+import numpy as np
+from msgspec import Meta
+
+from constants import USERNAME_TYPE_ENCODING
+
+# Constrained scalar types (mirror the previous pydantic confloat/conint fields)
+NonNegFloat = Annotated[float, Meta(ge=0)]
+NonNegInt = Annotated[int, Meta(ge=0)]
+UnitFloat = Annotated[float, Meta(ge=0, le=1)]
+
+# Substring lists behind ProcessMonitorRequest's derived flags, each compiled
+# into one alternation so a single search() replaces an any() loop
+_SUSPICIOUS_NAME_RE = re.compile("|".join(map(re.escape, [
+    'wget', 'curl', 'nc', 'netcat', 'socat', 'telnet',
+    'python -c', 'perl -e', 'bash -c', 'sh -c',
+    'base64', 'xxd', 'uuencode', 'openssl'
+])))
+_SUSPICIOUS_COMMAND_RE = re.compile("|".join(map(re.escape, [
+    '/tmp/', '/var/tmp/', 'chmod +x', 'wget http',
+    'curl -o', '&gt;', 'reverse shell', 'nc -l',
+    'python -c "import', '/etc/passwd', '/etc/shadow'
+])))
+
+
+def _generated_asdict(cls):
+    """Class decorator: attach a generated ``_asdict(self)`` to a Struct.
+
+    The function is built once from the struct's field list and reads
+    each field straight into a new dict, skipping fields that
+    default to None while unset, so to_features_dict() avoids the generic
+    asdict() copy plus a second filtering pass.
+    """
+    lines = ["def _asdict(self):", "    d = {}"]
+    for f in msgspec.structs.fields(cls):
+        if f.default is None:
+            lines.append(f"    if self.{f.name} is not None:")
+            lines.append(f"        d[{f.name!r}] = self.{f.name}")
+        else:
+            lines.append(f"    d[{f.name!r}] = self.{f.name}")
+    lines.append("    return d")
+    namespace: dict = {}
+    exec(compile("\n".join(lines), f"<{cls.__name__}._asdict>", "exec"), namespace)
+    cls._asdict = namespace["_asdict"]
+    return cls
+
+
+@_generated_asdict
+class DetectRequest(msgspec.Struct):
+    # Width of the network and authentication feature vectors
+    FEATURE_DIM: ClassVar[int] = 6
 
-class DetectRequest(BaseModel):
     # Network traffic features (original)
-    packets_per_second: confloat(ge=0) = 0
-    bytes_per_second: confloat(ge=0) = 0
-    unique_ips: conint(ge=0) = 0
-    unique_ports: conint(ge=0) = 0
-    tcp_packets: conint(ge=0) = 0
-    udp_packets: conint(ge=0) = 0 
-    syn_packets: conint(ge=0) = 0
-    
+    packets_per_second: NonNegFloat = 0
+    bytes_per_second: NonNegFloat = 0
+    unique_ips: NonNegInt = 0
+    unique_ports: NonNegInt = 0
+    tcp_packets: NonNegInt = 0
+    udp_packets: NonNegInt = 0
+    syn_packets: NonNegInt = 0
+
     # Authentication/Security logs features (Rakuten-style)
-    username_type: str = None                    # "service", "password", "command", "username"
-    confidence_score: confloat(ge=0, le=1) = None
-    privilege_level: conint(ge=0, le=1) = None   # 0=normal, 1=elevated
-    total_attempts: conint(ge=0) = None
-    failed_attempts: conint(ge=0) = None  
-    successful_attempts: conint(ge=0) = None
-    unique_source_ips: conint(ge=0) = None
-    
+    # "service", "password", "command", "username"
+    username_type: Optional[str] = None
+    confidence_score: Optional[UnitFloat] = None
+    # 0=normal, 1=elevated
+    privilege_level: Optional[Annotated[int, Meta(ge=0, le=1)]] = None
+    total_attempts: Optional[NonNegInt] = None
+    failed_attempts: Optional[NonNegInt] = None
+    successful_attempts: Optional[NonNegInt] = None
+    unique_source_ips: Optional[NonNegInt] = None
+
     # For backward compatibility - deprecated
-    tcp_ratio: confloat(ge=0, le=1) = None
+    tcp_ratio: Optional[UnitFloat] = None
 
     def to_features_dict(self) -> dict:
-        data = self.dict()
-        # Remove None values for backward compatibility
-        return {k: v for k, v in data.items() if v is not None}
-    
+        # Unset (None) fields are omitted for backward compatibility
+        return self._asdict()
+
     def get_detection_type(self) -> str:
         """Determine detection type based on available data."""
         if self.username_type is not None:
@@ -38,69 +89,94 @@ class DetectRequest(BaseModel):
         else:
             return "network"
 
+    def to_features_vector(self, out: np.ndarray) -> np.ndarray:
+        """Fill ``out[0]`` with the model feature vector and return ``out``.
+
+        Same layout as ThreatDetector._extract_features produces for the
+        equivalent features dict, written straight from the struct fields.
+        """
+        row = out[0]
+        if self.username_type:
+            row[0] = USERNAME_TYPE_ENCODING.get(self.username_type, 0)
+            row[1] = self.total_attempts or 0
+            row[2] = self.failed_attempts or 0
+            row[3] = self.successful_attempts or 0
+            row[4] = self.unique_source_ips or 0
+            row[5] = self.privilege_level or 0
+        else:
+            total_packets = self.tcp_packets + self.udp_packets
+            row[0] = self.packets_per_second
+            row[1] = self.bytes_per_second
+            row[2] = self.unique_ips
+            row[3] = self.unique_ports
+            row[4] = self.tcp_packets / total_packets if total_packets > 0 else 0.5
+            row[5] = self.syn_packets
+        return out
 
-class UserBehaviorRequest(BaseModel):
+
+@_generated_asdict
+class UserBehaviorRequest(msgspec.Struct):
     """Schema for user behavior analysis data."""
     user_id: str
-    session_duration: conint(ge=0) = 0  # seconds
-    commands_executed: conint(ge=0) = 0
+    session_duration: NonNegInt = 0  # seconds
+    commands_executed: NonNegInt = 0
     files_accessed: List[str] = []
-    login_time_hour: conint(ge=0, le=23) = 12  # 0-23 hour format
+    login_time_hour: Annotated[int, Meta(ge=0, le=23)] = 12  # 0-23 hour format
     login_source: str = "local"  # "local", "remote", "vpn"
-    privilege_escalations: conint(ge=0) = 0
-    failed_auth_attempts: conint(ge=0) = 0
-    successful_auth_attempts: conint(ge=0) = 1
-    unique_source_ips: conint(ge=0) = 1
-    data_downloaded_mb: confloat(ge=0) = 0
-    data_uploaded_mb: confloat(ge=0) = 0
-    sudo_commands: conint(ge=0) = 0
-    
+    privilege_escalations: NonNegInt = 0
+    failed_auth_attempts: NonNegInt = 0
+    successful_auth_attempts: NonNegInt = 1
+    unique_source_ips: NonNegInt = 1
+    data_downloaded_mb: NonNegFloat = 0
+    data_uploaded_mb: NonNegFloat = 0
+    sudo_commands: NonNegInt = 0
+
     def to_features_dict(self) -> dict:
         """Convert to features dictionary for ML processing."""
-        return {k: v for k, v in self.dict().items() if v is not None}
+        return self._asdict()
 
 
-class ProcessMonitorRequest(BaseModel):
+@_generated_asdict
+class ProcessMonitorRequest(msgspec.Struct):
     """Schema for process monitoring and anomaly detection."""
     process_name: str
-    process_id: conint(ge=1)
+    process_id: Annotated[int, Meta(ge=1)]
     parent_process: str = "unknown"
     user_id: str = "unknown"
-    cpu_usage_percent: confloat(ge=0, le=100) = 0
-    memory_usage_mb: confloat(ge=0) = 0
-    network_connections: conint(ge=0) = 0
-    files_opened: conint(ge=0) = 0
+    cpu_usage_percent: Annotated[float, Meta(ge=0, le=100)] = 0
+    memory_usage_mb: NonNegFloat = 0
+    network_connections: NonNegInt = 0
+    files_opened: NonNegInt = 0
     command_line: str = ""
-    execution_time_seconds: conint(ge=0) = 0
-    child_processes: conint(ge=0) = 0
+    execution_time_seconds: NonNegInt = 0
+    child_processes: NonNegInt = 0
     is_privileged: bool = False
-    syscalls_per_second: confloat(ge=0) = 0
-    network_bytes_sent: confloat(ge=0) = 0
-    network_bytes_received: confloat(ge=0) = 0
-    
+    syscalls_per_second: NonNegFloat = 0
+    network_bytes_sent: NonNegFloat = 0
+    network_bytes_received: NonNegFloat = 0
+
     def to_features_dict(self) -> dict:
         """Convert to features dictionary for ML processing."""
-        data = self.dict()
+        data = self._asdict()
         # Add derived features
         data['is_suspicious_name'] = self._is_suspicious_process_name()
         data['is_suspicious_command'] = self._is_suspicious_command_line()
-        return {k: v for k, v in data.items() if v is not None}
-    
+        return data
+
     def _is_suspicious_process_name(self) -> bool:
         """Check if process name looks suspicious."""
-        suspicious_patterns = [
-            'wget', 'curl', 'nc', 'netcat', 'socat', 'telnet',
-            'python -c', 'perl -e', 'bash -c', 'sh -c',
-            'base64', 'xxd', 'uuencode', 'openssl'
-        ]
-        return any(pattern in self.process_name.lower() for pattern in suspicious_patterns)
-    
+        return _SUSPICIOUS_NAME_RE.search(self.process_name.lower()) is not None
+
     def _is_suspicious_command_line(self) -> bool:
         """Check if command line contains suspicious patterns."""
-        suspicious_patterns = [
-            '/tmp/', '/var/tmp/', 'chmod +x', 'wget http',
-            'curl -o', '&gt;', 'reverse shell', 'nc -l',
-            'python -c "import', '/etc/passwd', '/etc/shadow'
-        ]
-        return any(pattern in self.command_line.lower() for pattern in suspicious_patterns)
+        return _SUSPICIOUS_COMMAND_RE.search(self.command_line.lower()) is not None
+
+
+def decode_request(raw: bytes, schema: type):
+    """Decode and validate a raw JSON body straight into ``schema``.
 
+    Uses lax (non-strict) mode so numeric strings and integral floats are
+    coerced the same way the previous pydantic models accepted them.
+    Raises ``msgspec.DecodeError`` (or its ``ValidationError`` subclass).
+    """
+    return msgspec.json.decode(raw or b"{}", type=schema, strict=False)
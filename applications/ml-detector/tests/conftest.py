@@ -0,0 +1,14 @@
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Building the app starts a ThreatDetector; do it once for the whole run
+    return create_app()
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    return app.test_client()
@@ -1,23 +1,94 @@
 import json
+import threading
+
+import numpy as np
 
 from app import create_app
+from constants import TRAINING_CONFIG
+from threat_detector import ThreatDetector
 
 
-def test_health():
-    app = create_app()
-    client = app.test_client()
+def test_health(client):
     r = client.get("/health")
     assert r.status_code == 200
     data = r.get_json()
     assert data["service"] == "ml-detector"
 
 
-def test_detect_basic():
-    app = create_app()
-    client = app.test_client()
+def test_detect_basic(client):
     payload = {"packets_per_second": 10, "bytes_per_second": 1000}
-    r = client.post("/detect", data=json.dumps(payload), content_type="application/json")
+    r = client.post(
+        "/detect", data=json.dumps(payload), content_type="application/json"
+    )
     assert r.status_code == 200
     data = r.get_json()
     assert "threat_detected" in data
 
+
+def test_detect_invalid_payload(client):
+    payload = {"packets_per_second": -1}
+    r = client.post(
+        "/detect", data=json.dumps(payload), content_type="application/json"
+    )
+    assert r.status_code == 400
+    assert "error" in r.get_json()
+
+
+def test_detect_payload_too_large(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_CONTENT_LENGTH", 16)
+    payload = {"packets_per_second": 10, "bytes_per_second": 1000}
+    r = client.post(
+        "/detect", data=json.dumps(payload), content_type="application/json"
+    )
+    assert r.status_code == 413
+
+
+def test_detect_batch(client):
+    payload = [
+        {"packets_per_second": 10},
+        {"packets_per_second": 1200, "unique_ports": 50},
+    ]
+    r = client.post(
+        "/detect/batch", data=json.dumps(payload), content_type="application/json"
+    )
+    assert r.status_code == 200
+    data = r.get_json()
+    assert len(data) == 2
+    assert "port_scan" in data[1]["threat_types"]
+
+
+def test_detect_user_batch(client):
+    payload = [
+        {"user_id": "alice"},
+        {"user_id": "bob", "files_accessed": ["/etc/shadow"]},
+    ]
+    r = client.post(
+        "/detect/user/batch", data=json.dumps(payload), content_type="application/json"
+    )
+    assert r.status_code == 200
+    data = r.get_json()
+    assert len(data) == 2
+    assert "sensitive_file_access" in data[1]["threat_types"]
+
+
+def test_train_waits_for_model_save(tmp_path, monkeypatch):
+    # /train must wait behind a save holding the training lock, not answer 409
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path))
+    monkeypatch.setenv("TRAINING_ENABLED", "false")
+    detector = ThreatDetector(start=False)
+    width = detector.extract_features({}, add_to_training=False).shape[1]
+    rng = np.random.default_rng(0)
+    for _ in range(TRAINING_CONFIG["min_samples_for_training"]):
+        detector.high_confidence_window.append(rng.random(width))
+    client = create_app(detector).test_client()
+
+    detector._train_lock.acquire()
+    timer = threading.Timer(0.2, detector._train_lock.release)
+    timer.start()
+    try:
+        r = client.post("/train")
+    finally:
+        timer.join()
+        detector.shutdown()
+    assert r.status_code == 200
+    assert r.get_json()["status"] == "training completed"
@@ -6,10 +6,14 @@ Organized tests for each model component to ensure reliability.
 import pytest
 import numpy as np
 
+from models import temporal
 from models.spatial import SpatialAnomalyDetector
 from models.temporal import TemporalAnomalyDetector
 from models.statistical import StatisticalAnomalyDetector
 
+# Typical traffic feature row, tiled into training sets
+_NORMAL_ROW = np.array([[100, 50000, 5, 3, 0.8, 20]], dtype=np.float32)
+
 
 class TestSpatialDetector:
     """Tests for DBSCAN spatial anomaly detection."""
@@ -31,7 +35,7 @@ class TestSpatialDetector:
         detector = SpatialAnomalyDetector()
         
         # Train on normal data
-        normal_data = np.array([[100, 50000, 5, 3, 0.8, 20] for _ in range(60)])
+        normal_data = np.tile(_NORMAL_ROW, (60, 1))
         detector.fit(normal_data)
         
         # Test anomalous data (port scan pattern)
@@ -54,6 +58,35 @@ class TestTemporalDetector:
         
         # Should have built sequences
         assert len(detector.time_series_window) > 0
+    
+    def test_temporal_detector_add_samples_returns_batch_windows(self):
+        detector = TemporalAnomalyDetector()
+        rows = np.tile(_NORMAL_ROW, (15, 1))
+        rows[:, 0] += np.arange(15)
+        
+        windows = detector.add_samples(rows)
+        
+        # One sequence ends at each row once a full sequence exists
+        assert len(windows) == 15 - detector.sequence_length + 1
+        assert np.array_equal(windows[-1][-1], rows[-1])
+        assert np.array_equal(windows, detector.time_series_window)
+    
+    def test_saved_vae_restores_sampling_layer(self, tmp_path, monkeypatch):
+        detector = TemporalAnomalyDetector()
+        detector.vae = detector._build_vae(_NORMAL_ROW.shape[1])
+        detector.save(str(tmp_path))
+        
+        # A freshly started worker has not defined or registered the layer yet
+        monkeypatch.setattr(temporal, "_Sampling", None)
+        custom_objects = temporal.keras.utils.get_custom_objects()
+        monkeypatch.delitem(custom_objects, "ml_detector>Sampling")
+        
+        restored = TemporalAnomalyDetector()
+        assert restored.load(str(tmp_path))
+        vae = restored._restore_keras_model()
+        
+        sampling = temporal._sampling_layer()
+        assert any(isinstance(layer, sampling) for layer in vae.layers)
 
 
 class TestStatisticalDetector:
@@ -63,8 +96,8 @@ class TestStatisticalDetector:
         detector = StatisticalAnomalyDetector()
         
         # Create normal distribution
-        normal_data = np.array([[100 + np.random.normal(0, 10), 50000, 5, 3, 0.8, 20] 
-                               for _ in range(100)])
+        normal_data = np.tile(_NORMAL_ROW, (100, 1))
+        normal_data[:, 0] += np.random.default_rng(0).normal(0, 10, 100)
         detector.fit(normal_data)
         
         # Test clear outlier
@@ -81,7 +114,7 @@ def test_model_integration():
     statistical = StatisticalAnomalyDetector()
     
     # Generate training data
-    training_data = np.array([[100, 50000, 5, 3, 0.8, 20] for _ in range(120)])
+    training_data = np.tile(_NORMAL_ROW, (120, 1))
     
     # Train all models
     spatial.fit(training_data)
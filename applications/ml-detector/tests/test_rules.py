@@ -5,78 +5,63 @@ Tests to ensure rule engines correctly identify known threat patterns.
 """
 import pytest
 from rules.network_rules import NetworkRuleEngine
+from rules.user_behavior_rules import UserBehaviorRuleEngine
+
+
+@pytest.fixture(scope="module")
+def rule_engine():
+    return NetworkRuleEngine()
 
 
 class TestNetworkRules:
     """Tests for network traffic rule detection."""
     
-    def setUp(self):
-        self.rule_engine = NetworkRuleEngine()
-    
-    def test_port_scan_detection(self):
-        rule_engine = NetworkRuleEngine()
-        
-        # Port scan pattern
-        data = {
-            "unique_ports": 50,        # High port diversity
-            "packets_per_second": 1200, # High packet rate
-            "tcp_packets": 1100,
-            "udp_packets": 100
-        }
-        
-        threats = rule_engine.detect(data)
-        threat_types = [t[0] for t in threats]
-        
-        assert "port_scan" in threat_types
-    
-    def test_ddos_detection(self):
-        rule_engine = NetworkRuleEngine()
-        
-        # DDoS pattern
-        data = {
-            "packets_per_second": 15000,  # Very high PPS
-            "bytes_per_second": 10000000,  # High bandwidth
-            "unique_ips": 100
-        }
-        
+    @pytest.mark.parametrize("data,expected_threat", [
+        pytest.param(
+            {
+                "unique_ports": 50,        # High port diversity
+                "packets_per_second": 1200, # High packet rate
+                "tcp_packets": 1100,
+                "udp_packets": 100
+            },
+            "port_scan",
+            id="port_scan",
+        ),
+        pytest.param(
+            {
+                "packets_per_second": 15000,  # Very high PPS
+                "bytes_per_second": 10000000,  # High bandwidth
+                "unique_ips": 100
+            },
+            "ddos",
+            id="ddos",
+        ),
+        pytest.param(
+            {
+                "avg_latency_ms": 75,      # High latency
+                "jitter_ms": 15,          # High jitter
+                "packet_loss_rate": 0.08   # High packet loss
+            },
+            "qos_degradation",
+            id="qos_degradation",
+        ),
+        pytest.param(
+            {
+                "username_type": "service",  # Service account abuse
+                "total_attempts": 5000,    # Very high attempts
+                "privilege_level": 1       # Elevated privileges
+            },
+            "service_account_abuse",
+            id="authentication_anomaly",
+        ),
+    ])
+    def test_threat_detection(self, rule_engine, data, expected_threat):
         threats = rule_engine.detect(data)
         threat_types = [t[0] for t in threats]
         
-        assert "ddos" in threat_types
+        assert expected_threat in threat_types
     
-    def test_qos_degradation_detection(self):
-        rule_engine = NetworkRuleEngine()
-        
-        # QoS degradation pattern
-        data = {
-            "avg_latency_ms": 75,      # High latency
-            "jitter_ms": 15,          # High jitter
-            "packet_loss_rate": 0.08   # High packet loss
-        }
-        
-        threats = rule_engine.detect(data)
-        threat_types = [t[0] for t in threats]
-        
-        assert "qos_degradation" in threat_types
-    
-    def test_authentication_anomaly_detection(self):
-        rule_engine = NetworkRuleEngine()
-        
-        # Service account abuse
-        data = {
-            "username_type": "service",
-            "total_attempts": 5000,    # Very high attempts
-            "privilege_level": 1       # Elevated privileges
-        }
-        
-        threats = rule_engine.detect(data)
-        threat_types = [t[0] for t in threats]
-        
-        assert "service_account_abuse" in threat_types
-    
-    def test_normal_traffic_no_detection(self):
-        rule_engine = NetworkRuleEngine()
-        
+    def test_normal_traffic_no_detection(self, rule_engine):
         # Normal traffic pattern
         data = {
             "packets_per_second": 150,
@@ -88,4 +73,38 @@ class TestNetworkRules:
         
         threats = rule_engine.detect(data)
         
-        assert len(threats) == 0  # Should not trigger any rules
\ No newline at end of file
+        assert len(threats) == 0  # Should not trigger any rules
+    
+    def test_detect_batch_matches_detect(self, rule_engine):
+        records = [
+            {"unique_ports": 50, "packets_per_second": 1200,
+             "tcp_packets": 1100, "udp_packets": 100},
+            {"packets_per_second": 15000, "bytes_per_second": 10000000,
+             "unique_ips": 100},
+            {"avg_latency_ms": 75, "jitter_ms": 15, "packet_loss_rate": 0.08},
+            {"packets_per_second": 150, "bytes_per_second": 75000, "unique_ports": 5,
+             "tcp_packets": 140, "udp_packets": 10},
+        ]
+        
+        expected = [rule_engine.detect(d) for d in records]
+        assert rule_engine.detect_batch(records) == expected
+
+
+class TestUserBehaviorRules:
+    """Tests for user behavior rule detection."""
+
+    @pytest.mark.parametrize("files_accessed,expected", [
+        pytest.param(
+            (f for f in ["/etc/shadow", "/tmp/a"]),
+            ["sensitive_file_access"],
+            id="generator",
+        ),
+        pytest.param("/etc/passwd", [], id="string"),
+        pytest.param(5, [], id="non_iterable"),
+    ])
+    def test_files_accessed_shapes(self, files_accessed, expected):
+        engine = UserBehaviorRuleEngine()
+
+        threats = engine.detect({"files_accessed": files_accessed})
+
+        assert [name for name, _ in threats] == expected
@@ -9,14 +9,15 @@ import threading
 import time
 import os
 from collections import deque
-from typing import Dict, List, Deque, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Deque, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-from models.base import DetectionResult
+from models.base import BaseRuleEngine, DetectionResult
 from models.spatial import SpatialAnomalyDetector
 from models.temporal import TemporalAnomalyDetector  
 from models.statistical import StatisticalAnomalyDetector
+from models.ensemble import Ensemble
 from rules.network_rules import NetworkRuleEngine
 from rules.user_behavior_rules import UserBehaviorRuleEngine
 from rules.process_monitor_rules import ProcessMonitorRuleEngine
@@ -26,8 +27,8 @@ from constants import (
 )
 from metrics import (
     TRAINING_DATA_QUALITY, TRAINING_WINDOW_SIZE, ADVANCED_MODEL_STATUS,
-    MODEL_RETRAIN_COUNT, MODEL_RETRAIN_DURATION, IP_PACKET_COUNT,
-    SUSPICIOUS_IP_ACTIVITY, FEATURE_VALUES
+    MODEL_RETRAIN_COUNT, MODEL_RETRAIN_DURATION, FEATURE_VALUES,
+    ip_packet_gauge, ip_subnet, suspicious_ip_gauge
 )
 
 logger = logging.getLogger(__name__)
@@ -41,13 +42,23 @@ class ThreatDetector:
     comprehensive threat detection for network and authentication data.
     """
     
-    def __init__(self):
+    def __init__(self, start: bool = True):
         # Configuration
         self.model_path = os.getenv("MODEL_PATH", "/tmp/models")
         self.training_enabled = os.getenv("TRAINING_ENABLED", "true").lower() == "true"
         
-        # Thread safety
-        self._lock = threading.RLock()
+        # Thread safety (_lock is never re-entered, so a plain Lock suffices)
+        self._lock = threading.Lock()
+        # Serializes training runs (background loop and /train); held for
+        # the whole fit, unlike _lock
+        self._train_lock = threading.Lock()
+        
+        # Model persistence runs off the training thread; at most one save
+        # is queued at a time (guarded by _train_lock)
+        self._save_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ml_save"
+        )
+        self._save_pending = False
         self._shutdown_event = threading.Event()
         
         # Data windows for different confidence levels
@@ -59,9 +70,6 @@ class ThreatDetector:
         self.high_confidence_count = 0
         self.total_samples_count = 0
         
-        # Performance optimization: ThreadPool for parallel model execution
-        self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="ml_model")
-        
         # Initialize detection components
         self.spatial_detector = SpatialAnomalyDetector()
         self.temporal_detector = TemporalAnomalyDetector()
@@ -69,28 +77,78 @@ class ThreatDetector:
         self.network_rules = NetworkRuleEngine()
         self.user_behavior_rules = UserBehaviorRuleEngine()
         self.process_monitor_rules = ProcessMonitorRuleEngine()
+        self.ensemble = Ensemble({
+            "spatial": self.spatial_detector,
+            "temporal": self.temporal_detector,
+            "statistical": self.statistical_detector
+        })
+        
+        # Trained-state snapshot for /health, /stats and model_scores; the
+        # version is bumped whenever it is rebuilt so callers can cache
+        # anything derived from it
+        self.training_version = 0
+        self._models_trained: Dict[str, bool] = {}
         
         # Setup
         os.makedirs(self.model_path, exist_ok=True)
         self._load_all_models()
+        self._refresh_trained_flags()
+        
+        self._started = False
+        if start:
+            self.start()
+    
+    def start(self) -> None:
+        """
+        Per-process startup: load the VAE and start background training.
+        
+        Kept out of __init__ so a gunicorn master can preload the sklearn and
+        numpy models once and fork workers that share those pages; TensorFlow
+        state and threads do not survive fork, so each worker calls this
+        after forking (see gunicorn.conf.py).
+        """
+        if self._started:
+            return
+        self._started = True
+        self.temporal_detector.load(self.model_path)
+        self._refresh_trained_flags()
         
         # Start background training
         if self.training_enabled:
             self._start_background_training()
     
-    def extract_features(self, data: Dict[str, float], add_to_training: bool = True) -> np.ndarray:
-        """Extract features and optionally add to training windows."""
-        features = self._extract_features(data)
+    def extract_features(
+        self, data: Dict[str, float], add_to_training: bool = True,
+        features: Optional[np.ndarray] = None, detection_type: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Extract features and optionally add to training windows (only when
+        training is enabled).
         
-        if add_to_training:
+        ``features`` may be a caller-owned (1, D) buffer already filled from
+        the request schema; its row is copied before being retained, so the
+        caller can reuse the buffer for its next request. ``detection_type``
+        may be passed when the caller has already determined it.
+        """
+        caller_buffer = features is not None
+        if not caller_buffer:
+            if detection_type is None:
+                detection_type = self._get_detection_type(data)
+            features = self._extract_features(data, detection_type)
+        
+        # Read-only deployments never train, so retaining the sample would
+        # only cost a lock and three appends
+        if add_to_training and self.training_enabled:
+            sample = features[0].copy() if caller_buffer else features[0]
+            # High confidence determination (simplified); only reads data,
+            # so it is decided before taking the lock
+            high_confidence = self._is_high_confidence_sample(data)
             with self._lock:
                 self.total_samples_count += 1
-                self.all_data_window.append(features[0])
-                self.recent_window.append(features[0])
-                
-                # High confidence determination (simplified)
-                if self._is_high_confidence_sample(data):
-                    self.high_confidence_window.append(features[0])
+                self.all_data_window.append(sample)
+                self.recent_window.append(sample)
+                if high_confidence:
+                    self.high_confidence_window.append(sample)
                     self.high_confidence_count += 1
         
         return features
@@ -102,64 +160,175 @@ class ThreatDetector:
         ports = data.get("unique_ports", 0)
         return pps < 500 and ports < 15
     
-    def detect(self, data: Dict[str, float]) -> DetectionResult:
+    def detect(
+        self, data: Dict[str, float], features: Optional[np.ndarray] = None
+    ) -> DetectionResult:
         """
         Main detection method.
         
         Args:
             data: Raw input data (network or authentication)
+            features: Optional pre-filled (1, D) feature buffer for ``data``
             
         Returns:
             DetectionResult with threat analysis
         """
         try:
+            # Detection type is decided once and passed to every stage
+            detection_type = self._get_detection_type(data)
             # Extract features and add to training
-            features = self.extract_features(data, add_to_training=True)
-            
-            # Process IP-specific metrics
-            attacking_ips = self._identify_attacking_ips(data)
-            self._update_ip_metrics(data)
-            
-            # Rule-based detection (fast) - select appropriate engine
-            rule_threats = self._detect_with_rules(data)
-            
-            # ML-based detection (comprehensive)
-            ml_threats = self._detect_with_ml_ensemble(features)
+            features = self.extract_features(
+                data, add_to_training=True, features=features,
+                detection_type=detection_type
+            )
+            return self._analyze(data, features, detection_type=detection_type)
             
-            # Combine results
-            all_threats = rule_threats + ml_threats
+        except Exception as e:
+            logger.error(f"Detection error: {e}")
+            return DetectionResult(False, 0.0, [], [])
+    
+    def detect_batch(
+        self, records: List[Dict[str, float]], features: Optional[np.ndarray] = None
+    ) -> List[DetectionResult]:
+        """
+        Detect threats for many records in one call.
+        
+        The statistical model scores the whole batch with a single
+        median/MAD pass and the VAE with a single forward pass; every other
+        stage runs per record, in order.
+        
+        Args:
+            records: Raw input records (same shape as for detect())
+            features: Optional pre-filled (N, D) feature matrix, one row per record
             
-            if all_threats:
-                max_confidence = max(threat[1] for threat in all_threats)
-                threat_types = [threat[0] for threat in all_threats]
-                
-                # Update metrics
-                self._update_threat_metrics(threat_types, max_confidence, attacking_ips)
-                
-                return DetectionResult(
-                    threat_detected=True,
-                    confidence=max_confidence,
-                    threat_types=threat_types,
-                    attacking_ips=attacking_ips,
-                    detection_type=self._get_detection_type(data),
-                    model_scores=self._get_model_scores()
+        Returns:
+            One DetectionResult per record, in input order
+        """
+        detection_types = [self._get_detection_type(data) for data in records]
+        if features is None:
+            features = [
+                self.extract_features(
+                    data, add_to_training=True, detection_type=detection_type
                 )
+                for data, detection_type in zip(records, detection_types, strict=True)
+            ]
+        else:
+            features = [
+                self.extract_features(
+                    data, add_to_training=True, features=features[i:i + 1],
+                    detection_type=detection_types[i]
+                )
+                for i, data in enumerate(records)
+            ]
+        
+        statistical_scores = None
+        temporal_scores = None
+        if features and len({f.shape for f in features}) == 1:
+            stacked = np.vstack(features)
+            if self.statistical_detector.is_trained():
+                statistical_scores = self.statistical_detector.predict_batch(stacked)
+            if self.temporal_detector.is_trained():
+                temporal_scores = self._score_temporal_batch(stacked)
+        
+        rule_threats = self._detect_with_rules_batch(records, detection_types)
+        
+        results = []
+        for i, (data, row) in enumerate(zip(records, features, strict=True)):
+            try:
+                results.append(self._analyze(
+                    data, row,
+                    scores=(
+                        None if statistical_scores is None
+                        else float(statistical_scores[i]),
+                        None if temporal_scores is None else float(temporal_scores[i]),
+                    ),
+                    rule_threats=rule_threats[i], detection_type=detection_types[i]
+                ))
+            except Exception as e:
+                logger.error(f"Detection error: {e}")
+                results.append(DetectionResult(False, 0.0, [], []))
+        return results
+    
+    def _score_temporal_batch(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Append every row to the VAE sequence and score the sequence ending
+        at each one with a single predict_batch call. Rows seen before a
+        full sequence exists score 0.0, as predict() would.
+        """
+        windows = self.temporal_detector.add_samples(rows)
+        scores = np.zeros(len(rows))
+        if len(windows):
+            scores[len(rows) - len(windows):] = (
+                self.temporal_detector.predict_batch(windows)
+            )
+        return scores
+    
+    def _analyze(
+        self, data: Dict[str, float], features: np.ndarray,
+        scores: Tuple[Optional[float], Optional[float]] = (None, None),
+        rule_threats: Optional[List[Tuple[str, float]]] = None,
+        detection_type: Optional[str] = None,
+    ) -> DetectionResult:
+        """
+        Run rules and the ML ensemble over already-extracted features.
+        
+        ``scores`` holds the (statistical, temporal) scores already computed
+        by the models' ``predict_batch``; None entries are scored here.
+        """
+        if detection_type is None:
+            detection_type = self._get_detection_type(data)
+        # Process IP-specific metrics
+        attacking_ips = self._identify_attacking_ips(data)
+        self._update_ip_metrics(data)
+        
+        # Rule-based detection (fast) - select appropriate engine
+        if rule_threats is None:
+            rule_threats = self._detect_with_rules(data, detection_type)
+        
+        # ML-based detection (comprehensive)
+        ml_threats = self._detect_with_ml_ensemble(features, *scores)
+        
+        # Combine results
+        all_threats = rule_threats + ml_threats
+        
+        if all_threats:
+            # Threat types and the top confidence in one pass
+            threat_types = []
+            max_confidence = all_threats[0][1]
+            for threat_type, confidence in all_threats:
+                threat_types.append(threat_type)
+                max_confidence = max(max_confidence, confidence)
+            
+            # Update metrics
+            self._update_threat_metrics(threat_types, max_confidence, attacking_ips)
             
             return DetectionResult(
-                threat_detected=False,
-                confidence=0.0,
-                threat_types=[],
+                threat_detected=True,
+                confidence=max_confidence,
+                threat_types=threat_types,
                 attacking_ips=attacking_ips,
-                detection_type=self._get_detection_type(data)
+                detection_type=detection_type,
+                model_scores=self._get_model_scores()
             )
-            
-        except Exception as e:
-            logger.error(f"Detection error: {e}")
-            return DetectionResult(False, 0.0, [], [])
+        
+        return DetectionResult(
+            threat_detected=False,
+            confidence=0.0,
+            threat_types=[],
+            attacking_ips=attacking_ips,
+            detection_type=detection_type
+        )
     
-    def _extract_features(self, data: Dict[str, float]) -> np.ndarray:
-        """Extract features based on data type."""
-        if data.get("user_id"):
+    def _extract_features(
+        self, data: Dict[str, float], detection_type: str
+    ) -> np.ndarray:
+        """
+        Extract features for the record's detection type (network layout for QoS).
+        
+        Rows are float32, the dtype the API's feature buffers and every
+        model's predict() already use, so nothing is converted downstream.
+        """
+        if detection_type == "user_behavior":
             # User behavior features
             return np.array([[
                 data.get("session_duration", 0) / 3600,  # Hours
@@ -170,8 +339,8 @@ class ThreatDetector:
                 data.get("privilege_escalations", 0),
                 data.get("data_uploaded_mb", 0),
                 data.get("sudo_commands", 0)
-            ]])
-        elif data.get("process_name"):
+            ]], dtype=np.float32)
+        elif detection_type == "process_monitor":
             # Process monitoring features  
             return np.array([[
                 data.get("cpu_usage_percent", 0),
@@ -183,8 +352,8 @@ class ThreatDetector:
                 data.get("syscalls_per_second", 0),
                 1 if data.get("is_suspicious_name") else 0,
                 1 if data.get("is_suspicious_command") else 0
-            ]])
-        elif data.get("username_type"):
+            ]], dtype=np.float32)
+        elif detection_type == "authentication":
             # Authentication features
             username_type_encoded = USERNAME_TYPE_ENCODING.get(
                 data.get("username_type", "username"), 0
@@ -196,7 +365,7 @@ class ThreatDetector:
                 data.get("successful_attempts", 0),
                 data.get("unique_source_ips", 0),
                 data.get("privilege_level", 0)
-            ]])
+            ]], dtype=np.float32)
         else:
             # Network features
             tcp_packets = data.get("tcp_packets", 0)
@@ -211,51 +380,49 @@ class ThreatDetector:
                 data.get("unique_ports", 0),
                 tcp_ratio,
                 data.get("syn_packets", 0)
-            ]])
+            ]], dtype=np.float32)
     
-    def _detect_with_ml_ensemble(self, features: np.ndarray) -> List[Tuple[str, float]]:
-        """Run ML ensemble detection with consensus - OPTIMIZED for real-time."""
-        scores = {}
-        
-        # Execute models in parallel for better real-time performance
-        def run_spatial():
-            if self.spatial_detector.is_trained():
-                return ('spatial', self.spatial_detector.predict(features))
-            return ('spatial', 0.0)
-        
-        def run_temporal():
-            self.temporal_detector.add_sample(features)  # Still need to add sample
-            if self.temporal_detector.is_trained():
-                return ('temporal', self.temporal_detector.predict(features))
-            return ('temporal', 0.0)
+    def _detect_with_ml_ensemble(
+        self, features: np.ndarray,
+        statistical_score: Optional[float] = None,
+        temporal_score: Optional[float] = None,
+    ) -> List[Tuple[str, float]]:
+        """Run ML ensemble detection with consensus.
         
-        def run_statistical():
-            if self.statistical_detector.is_trained():
-                return ('statistical', self.statistical_detector.predict(features))
-            return ('statistical', 0.0)
-        
-        # Submit all model predictions in parallel
-        futures = {
-            self._executor.submit(run_spatial): 'spatial',
-            self._executor.submit(run_temporal): 'temporal', 
-            self._executor.submit(run_statistical): 'statistical'
-        }
+        ``statistical_score`` and ``temporal_score`` may carry scores already
+        computed by the models' ``predict_batch`` (the temporal sample has
+        then already been added).
+        """
+        spatial_trained, temporal_trained, statistical_trained = (
+            self.ensemble.trained.tolist()
+        )
         
-        # Collect results as they complete
-        for future in as_completed(futures):
-            try:
-                model_name, score = future.result()
-                scores[model_name] = score
-            except Exception as e:
-                logger.warning(f"Model {futures[future]} prediction failed: {e}")
-                scores[futures[future]] = 0.0
+        if not (spatial_trained or temporal_trained or statistical_trained):
+            # Nothing can score before the first training run; the VAE still
+            # needs the sample for the sequence history it will train on
+            if temporal_score is None:
+                try:
+                    self.temporal_detector.add_sample(features)
+                except Exception as e:
+                    logger.warning(f"Model temporal prediction failed: {e}")
+            return []
+        
+        spatial, temporal, statistical = self._model_scores(
+            features, (spatial_trained, temporal_trained, statistical_trained),
+            statistical_score, temporal_score,
+        )
         
         # Same consensus logic (unchanged)
-        active_scores = [s for s in scores.values() if s > 0]
+        # At most three scores: plain float accumulation, no numpy dispatch
+        active_count = (spatial > 0) + (temporal > 0) + (statistical > 0)
         
         result = []
-        if len(active_scores) >= 2:  # At least 2 models agree
-            final_score = np.mean(active_scores)
+        if active_count >= 2:  # At least 2 models agree
+            final_score = (
+                (spatial if spatial > 0 else 0.0)
+                + (temporal if temporal > 0 else 0.0)
+                + (statistical if statistical > 0 else 0.0)
+            ) / active_count
             
             # Classify based on consensus
             if final_score > CONSENSUS_THRESHOLDS["critical_risk"]:
@@ -269,77 +436,163 @@ class ThreatDetector:
         
         return result
     
-    def _detect_with_rules(self, data: Dict[str, float]) -> List[Tuple[str, float]]:
+    def _model_scores(
+        self, features: np.ndarray, trained: Tuple[bool, bool, bool],
+        statistical_score: Optional[float], temporal_score: Optional[float],
+    ) -> Tuple[float, float, float]:
+        """Collect the (spatial, temporal, statistical) scores for one sample."""
+        spatial_trained, temporal_trained, statistical_trained = trained
+        
+        # Each predict() is a few microseconds of numpy on one row, so the
+        # models run inline on the request thread; a failing model scores 0.0
+        spatial = temporal = statistical = 0.0
+        try:
+            if spatial_trained:
+                spatial = self.spatial_detector.predict(features)
+        except Exception as e:
+            logger.warning(f"Model spatial prediction failed: {e}")
+            spatial = 0.0
+        
+        try:
+            if temporal_score is not None:
+                temporal = temporal_score
+            else:
+                self.temporal_detector.add_sample(features)  # Still need to add sample
+                if temporal_trained:
+                    temporal = self.temporal_detector.predict(features)
+        except Exception as e:
+            logger.warning(f"Model temporal prediction failed: {e}")
+            temporal = 0.0
+        
+        try:
+            if statistical_score is not None:
+                statistical = statistical_score
+            elif statistical_trained:
+                statistical = self.statistical_detector.predict(features)
+        except Exception as e:
+            logger.warning(f"Model statistical prediction failed: {e}")
+            statistical = 0.0
+        
+        return spatial, temporal, statistical
+    
+    def _detect_with_rules(
+        self, data: Dict[str, float], detection_type: str
+    ) -> List[Tuple[str, float]]:
         """Apply appropriate rule engine based on data type."""
-        detection_type = self._get_detection_type(data)
+        return self._rule_engine_for(detection_type).detect(data)
+    
+    def _detect_with_rules_batch(
+        self, records: List[Dict[str, float]], detection_types: List[str]
+    ) -> List[Optional[List[Tuple[str, float]]]]:
+        """
+        Rule threats for every record, running each engine once over all of
+        its records. A failing engine leaves None for its records so
+        _analyze() retries them one at a time.
+        """
+        groups: Dict[BaseRuleEngine, List[int]] = {}
+        for i, detection_type in enumerate(detection_types):
+            groups.setdefault(self._rule_engine_for(detection_type), []).append(i)
         
-        if detection_type == "network":
-            return self.network_rules.detect(data)
-        elif detection_type == "user_behavior":
-            return self.user_behavior_rules.detect(data)
+        rule_threats: List[Optional[List[Tuple[str, float]]]] = [None] * len(records)
+        for engine, indices in groups.items():
+            try:
+                batch = engine.detect_batch([records[i] for i in indices])
+            except Exception as e:
+                logger.debug(
+                    f"Batch rule evaluation failed, falling back per record: {e}"
+                )
+                continue
+            for i, threats in zip(indices, batch, strict=True):
+                rule_threats[i] = threats
+        return rule_threats
+    
+    def _rule_engine_for(self, detection_type: str) -> BaseRuleEngine:
+        """Select the rule engine for the record's detection type."""
+        if detection_type == "user_behavior":
+            return self.user_behavior_rules
         elif detection_type == "process_monitor":
-            return self.process_monitor_rules.detect(data)
-        elif detection_type == "authentication":
-            return self.network_rules.detect(data)  # Fallback to network rules
+            return self.process_monitor_rules
         else:
-            return self.network_rules.detect(data)  # Default fallback
+            return self.network_rules  # network and QoS; fallback for authentication
     
     def _identify_attacking_ips(self, data: Dict[str, float]) -> List[str]:
         """Identify specific attacking IPs from top_ips data."""
-        top_ips = data.get("top_ips", {})
-        attacking_ips = []
-        
-        if isinstance(top_ips, dict):
-            for ip, count in top_ips.items():
-                if count > IP_SUSPICIOUS_THRESHOLD:
-                    attacking_ips.append(ip)
-        
-        return attacking_ips
+        top_ips = data.get("top_ips")
+        if not top_ips:
+            return []
+        try:
+            items = top_ips.items()
+        except AttributeError:  # top_ips is {ip: count}; ignore anything else
+            return []
+        # Values must be read back out of the dict either way, so a numpy
+        # comparison never pays for its array construction here
+        return [ip for ip, count in items if count > IP_SUSPICIOUS_THRESHOLD]
     
     def _update_ip_metrics(self, data: Dict[str, float]) -> None:
         """Update IP-specific metrics for Grafana."""
-        top_ips = data.get("top_ips", {})
-        
-        if isinstance(top_ips, dict):
-            for ip, count in top_ips.items():
-                IP_PACKET_COUNT.labels(source_ip=ip).set(count)
-                suspicion_level = min(count / 1000.0, 1.0)
-                SUSPICIOUS_IP_ACTIVITY.labels(
-                    source_ip=ip, 
-                    activity_type="packet_rate"
-                ).set(suspicion_level)
+        top_ips = data.get("top_ips")
+        if not top_ips:
+            return
+        try:
+            items = top_ips.items()
+        except AttributeError:  # top_ips is {ip: count}; ignore anything else
+            return
+        
+        # Gauges are per /24, so addresses sharing a subnet are summed
+        subnet_counts: Dict[str, float] = {}
+        for ip, count in items:
+            subnet = ip_subnet(ip)
+            subnet_counts[subnet] = subnet_counts.get(subnet, 0) + count
+        for subnet, count in subnet_counts.items():
+            ip_packet_gauge(subnet).set(count)
+            suspicion_level = min(count / 1000.0, 1.0)
+            suspicious_ip_gauge(subnet, "packet_rate").set(suspicion_level)
     
     def _get_detection_type(self, data: Dict[str, float]) -> str:
-        """Determine detection type based on data."""
+        """Determine detection type based on data; called once per record."""
+        get = data.get
         # Check for process monitoring data FIRST (process_name is unique identifier)
-        if data.get("process_name") or data.get("process_id"):
+        if get("process_name") or get("process_id"):
             return "process_monitor"
         # Check for user behavior data (user_id that's not "unknown")
-        elif data.get("user_id") and data.get("user_id") != "unknown":
+        user_id = get("user_id")
+        if user_id and user_id != "unknown":
             return "user_behavior"
         # Check for authentication data
-        elif data.get("username_type"):
+        if get("username_type"):
             return "authentication"
         # Check for QoS/transport data
-        elif data.get("avg_latency_ms") is not None:
+        if get("avg_latency_ms") is not None:
             return "transport_qos"
-        else:
-            return "network"
+        return "network"
     
     def _get_model_scores(self) -> Dict[str, float]:
         """Get current model scores for debugging."""
+        ensemble = self.ensemble
         return {
-            "spatial_trained": 1.0 if self.spatial_detector.is_trained() else 0.0,
-            "temporal_trained": 1.0 if self.temporal_detector.is_trained() else 0.0,
-            "statistical_trained": 1.0 if self.statistical_detector.is_trained() else 0.0
+            f"{name}_trained": 1.0 if trained else 0.0
+            for name, trained in zip(
+                ensemble.names, ensemble.trained.tolist(), strict=True
+            )
         }
     
+    def models_trained(self) -> Dict[str, bool]:
+        """Trained flag per model, as of the last load/training run (do not mutate)."""
+        return self._models_trained
+    
+    def _refresh_trained_flags(self) -> None:
+        """Re-read the models' trained flags and bump training_version."""
+        self.ensemble.refresh()
+        self._models_trained = self.ensemble.trained_dict()
+        self.training_version += 1
+    
     def _start_background_training(self) -> None:
         """Start background training thread."""
         def training_loop():
             while not self._shutdown_event.wait(TRAINING_CONFIG["interval_seconds"]):
                 try:
-                    self.train_models()
+                    # Skip this interval rather than wait behind a save
+                    self.train_models(blocking=False)
                 except Exception as e:
                     logger.error(f"Background training error: {e}")
             logger.info("Background training stopped")
@@ -347,36 +600,77 @@ class ThreatDetector:
         thread = threading.Thread(target=training_loop, daemon=True)
         thread.start()
     
-    def train_models(self) -> None:
-        """Train all ML models."""
-        if len(self.high_confidence_window) < TRAINING_CONFIG["min_samples_for_training"]:
-            return
+    def train_models(self, blocking: bool = True) -> bool:
+        """
+        Train all ML models.
         
-        start_time = time.time()
+        With ``blocking=False`` the run is skipped when another training run
+        or a model save holds the training lock, instead of waiting on it;
+        the background loop does this, while /train waits its turn.
+        
+        Returns:
+            False if the run was skipped because training was busy
+        """
+        if len(self.high_confidence_window) < TRAINING_CONFIG["min_samples_for_training"]:
+            return True
         
-        with self._lock:
+        if not self._train_lock.acquire(blocking=blocking):
+            return False
+        try:
+            start_time = time.perf_counter()
+            
+            # Snapshot the windows under the sample lock; copying the row
+            # references takes microseconds, so detect() is never blocked
+            # for the duration of a fit
+            with self._lock:
+                conservative_rows = list(self.high_confidence_window)
+                all_rows = (
+                    list(self.all_data_window) if len(self.all_data_window) > 50
+                    else None
+                )
+            
             # Prepare training data
-            X_conservative = np.array(list(self.high_confidence_window))
-            X_all = np.array(list(self.all_data_window)) if len(self.all_data_window) > 50 else X_conservative
+            X_conservative = np.array(conservative_rows)
+            X_all = np.array(all_rows) if all_rows is not None else X_conservative
             
             # Train each model
             self.spatial_detector.fit(X_all)  # DBSCAN uses all data
             self.temporal_detector.fit(X_conservative)  # VAE uses clean data
             self.statistical_detector.fit(X_all)  # ZMAD uses all history
+            self._refresh_trained_flags()
             
             # Update metrics
             self._update_training_metrics()
+            
+            duration = time.perf_counter() - start_time
+            MODEL_RETRAIN_DURATION.labels(model_name="ensemble").observe(duration)
+            
+            # Save models in the background; a save already queued will
+            # pick up these models, so another one is not needed
+            if not self._save_pending:
+                self._save_pending = True
+                self._save_executor.submit(self._save_pending_models)
+        finally:
+            self._train_lock.release()
+        return True
+    
+    def _save_pending_models(self) -> None:
+        """
+        Save the current models; holds _train_lock so no fit runs mid-save.
         
-        duration = time.time() - start_time
-        MODEL_RETRAIN_DURATION.labels(model_name="ensemble").observe(duration)
-        
-        # Save models
-        self._save_all_models()
+        A background training run that finds the lock held skips its turn
+        instead of waiting on the disk write; /train waits (see train_models).
+        """
+        with self._train_lock:
+            self._save_pending = False
+            try:
+                self._save_all_models()
+            except Exception as e:
+                logger.error(f"Model save error: {e}")
     
     def _load_all_models(self) -> None:
-        """Load all saved models."""
+        """Load the saved fork-safe models (the VAE is loaded in start())."""
         self.spatial_detector.load(self.model_path)
-        self.temporal_detector.load(self.model_path)
         self.statistical_detector.load(self.model_path)
     
     def _save_all_models(self) -> None:
@@ -393,9 +687,8 @@ class ThreatDetector:
         TRAINING_WINDOW_SIZE.labels(window_type="high_confidence").set(len(self.high_confidence_window))
         TRAINING_WINDOW_SIZE.labels(window_type="all_data").set(len(self.all_data_window))
         
-        ADVANCED_MODEL_STATUS.labels(model_name="spatial").set(1.0 if self.spatial_detector.is_trained() else 0.0)
-        ADVANCED_MODEL_STATUS.labels(model_name="temporal").set(1.0 if self.temporal_detector.is_trained() else 0.0)
-        ADVANCED_MODEL_STATUS.labels(model_name="statistical").set(1.0 if self.statistical_detector.is_trained() else 0.0)
+        for name, trained in self._models_trained.items():
+            ADVANCED_MODEL_STATUS.labels(model_name=name).set(1.0 if trained else 0.0)
     
     def _update_threat_metrics(self, threat_types: List[str], confidence: float, attacking_ips: List[str]) -> None:
         """Update threat-specific Prometheus metrics."""
@@ -404,6 +697,6 @@ class ThreatDetector:
         pass
     
     def shutdown(self) -> None:
-        """Gracefully shutdown background training and thread pool."""
+        """Gracefully shutdown background training, finishing any queued save."""
         self._shutdown_event.set()
-        self._executor.shutdown(wait=False)
\ No newline at end of file
+        self._save_executor.shutdown(wait=True)
\ No newline at end of file